@@ -0,0 +1,24 @@
+# server/__main__.py
+"""
+ws_app 실행 진입점:  python -m server   (HOST / PORT 환경변수)
+
+- uvloop이 있으면 이벤트 루프로 사용 (send_bytes/send_text 경로의 콜백 오버헤드 감소)
+- 없으면(Windows 등) uvicorn 기본 루프
+"""
+import os
+
+import uvicorn
+
+try:
+    import uvloop  # noqa: F401
+    _HAS_UVLOOP = True
+except Exception:
+    _HAS_UVLOOP = False
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "server.ws_app:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        loop="uvloop" if _HAS_UVLOOP else "auto",
+    )
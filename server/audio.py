@@ -0,0 +1,198 @@
+# server/audio.py
+"""
+PCM/WAV 변환과 블록 분할 헬퍼 (ws_app, server에서 사용).
+NumPy + 선택적 C 확장/numba만 사용: 모델/웹 프레임워크 없이 단독으로 import·테스트 가능
+"""
+import ctypes, io, os, struct
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except Exception:
+    _HAS_NUMBA = False
+
+# 선택: server/ext/pcm.c를 빌드한 공유 라이브러리 (게이트+클립+스케일+int16 팩 AVX2 1패스, 빌드법은 pcm.c 상단)
+def _load_pcm_ext():
+    ext_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ext")
+    for name in ("pcm.so", "pcm.dll", "pcm.dylib"):
+        path = os.path.join(ext_dir, name)
+        if os.path.exists(path):
+            fn = ctypes.CDLL(path).convert_and_frame
+            fn.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_float, ctypes.c_void_p)
+            fn.restype = None
+            return fn
+    raise ImportError("pcm extension not built")
+
+try:
+    _pcm_ext = _load_pcm_ext()
+    _HAS_PCM_EXT = True
+except Exception:
+    _HAS_PCM_EXT = False
+
+# RVC 출력(=송출) sr: 프리셋 resample_sr와 같은 값. 이 sr 기준 고정 길이들은 아래에서 import 시 1회 계산
+OUT_SR = 24000
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _f32_to_pcm16_gated(src, dst, thr):
+        """
+        게이트(|v| < thr → 0) + 클립 + 스케일 + int16 저장을 1패스로 (prange로 코어 분할).
+        NaN은 0 (ext/pcm.c와 동일, fastmath면 NaN 검사가 지워지므로 끔).
+        곱셈도 C와 같이 float32로 (float64 상수가 섞이면 v가 float64로 승격돼 절삭 결과가 1 LSB 어긋남)
+        """
+        zero, lo, hi, scale = np.float32(0.0), np.float32(-1.0), np.float32(1.0), np.float32(32767.0)
+        for i in prange(src.shape[0]):
+            v = src[i]
+            if v != v or -thr < v < thr:
+                v = zero
+            elif v < lo:
+                v = lo
+            elif v > hi:
+                v = hi
+            dst[i] = np.int16(v * scale)
+
+def pcm16(pcm_f32: np.ndarray, clip: bool = False, gate: float = 0.0,
+          out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    float32 → int16 배열 (C 확장 > numba 커널 1패스, 둘 다 없으면 NumPy ufunc 1~2패스).
+    - 입력은 |x| <= 1 가정 (rvc.convert 출력은 peak 0.99 제한, 후처리는 축소만 함).
+      그 보장이 없는 입력이면 clip=True (C 확장/numba 커널은 항상 클립)
+    - gate > 0이면 |x| < gate 샘플을 0으로
+    - out: 재사용할 int16 버퍼 (길이 >= 입력), 앞부분 뷰를 반환
+    """
+    n = len(pcm_f32)
+    if _HAS_PCM_EXT or _HAS_NUMBA:
+        dst = np.empty(n, dtype=np.int16) if out is None else out[:n]
+        src = np.ascontiguousarray(pcm_f32, dtype=np.float32)
+        if _HAS_PCM_EXT:
+            _pcm_ext(src.ctypes.data, n, gate, dst.ctypes.data)  # ctypes 호출 중 GIL 해제
+        else:
+            _f32_to_pcm16_gated(src, dst, np.float32(gate))
+        return dst
+    if clip:
+        f = np.clip(pcm_f32, -1.0, 1.0)
+        f *= 32767.0
+    else:
+        f = np.multiply(pcm_f32, 32767.0, dtype=np.float32)
+    if gate > 0:
+        np.putmask(f, np.abs(pcm_f32) < gate, 0)
+    if out is None:
+        return f.astype(np.int16, copy=False)
+    dst = out[:n]
+    dst[...] = f
+    return dst
+
+@lru_cache(maxsize=16)
+def _silence(sr: int, ms: int) -> bytes:
+    """ms 길이 PCM16 무음 (sr/ms 조합별 1회 생성 후 재사용)"""
+    return bytes(2 * int(sr * ms / 1000))
+
+# OUT_SR 기준 20ms 프레임 / 20ms 무음 / 50ms 피스 간격 (피스마다 곱셈·할당 안 함)
+FRAME_SAMPLES_20MS = int(OUT_SR * 0.02)
+SILENCE_20MS = _silence(OUT_SR, 20)
+GAP_50MS = _silence(OUT_SR, 50)
+
+def _frame_samples(sr: int, frame_ms: int = 20) -> int:
+    return FRAME_SAMPLES_20MS if (sr, frame_ms) == (OUT_SR, 20) else int(sr * frame_ms / 1000)
+
+def split_frames(buf: np.ndarray, carry: np.ndarray, n: int, last: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    블록 이어 보내기: 직전 블록의 남은 샘플(carry)을 앞에 붙이고 → (지금 보낼 부분, 다음으로 넘길 나머지).
+    중간 블록은 프레임(n샘플) 배수까지만 보내고 나머지는 다음 블록 앞에 붙임 → 0 패딩은 마지막 블록 끝에만
+    """
+    if carry.size:
+        buf = np.concatenate((carry, buf))
+    if last or n <= 0:
+        return buf, buf[:0]
+    cut = len(buf) - len(buf) % n
+    return buf[:cut], buf[cut:].copy()
+
+def iter_pcm16_frames(pcm_f32: np.ndarray, sr: int, frame_ms: int = 20, batch: int = 1, clip: bool = False):
+    """
+    float32 → PCM16 프레임 바이너리 생성기 (변환은 pcm16으로 버퍼 전체에 1회, int16 입력은 그대로).
+    batch개 프레임을 한 덩어리로 yield (마지막 덩어리는 0 패딩된 프레임 단위로만 짧아질 수 있음).
+    한 발화를 여러 블록으로 보낼 때는 split_frames로 나머지를 넘겨 중간 블록 끝에 패딩이 생기지 않게
+    """
+    n = _frame_samples(sr, frame_ms)
+    m = len(pcm_f32)
+    if n <= 0 or m == 0:
+        return
+    buf = pcm_f32 if pcm_f32.dtype == np.int16 else pcm16(pcm_f32, clip)
+    pad = (-m) % n
+    if pad:
+        buf = np.concatenate((buf, np.zeros(pad, dtype=np.int16)))
+    # int16 버퍼를 바이트 뷰로 잘라서 내보냄 (float 패딩 버퍼 없음, 슬라이스당 복사 1회는 ASGI bytes 요구)
+    mv = memoryview(buf).cast("B")
+    step = n * 2 * max(1, batch)
+    for i in range(0, len(mv), step):
+        yield mv[i:i + step].tobytes()
+
+# ws_rvc 블록 변환: 이 길이 근처의 가장 조용한 10ms 프레임에서 자름 (±탐색 폭), 1.5블록 미만은 통째로
+RVC_STREAM_BLOCK_SEC = 2.0
+RVC_STREAM_SEARCH_SEC = 0.5
+
+def _silence_cuts(x: np.ndarray, sr: int, block_sec: float = RVC_STREAM_BLOCK_SEC,
+                  search_sec: float = RVC_STREAM_SEARCH_SEC, frame_ms: int = 10) -> List[int]:
+    """블록 경계 샘플 인덱스 목록 (양끝 제외). 각 경계는 목표 위치 ±search_sec 안에서 에너지 최소 프레임의 시작"""
+    f = max(1, int(sr * frame_ms / 1000))
+    block = int(block_sec * sr)
+    if block <= 0 or len(x) < block * 3 // 2:
+        return []
+    nf = len(x) // f
+    fr = x[:nf * f].reshape(nf, f)
+    energy = np.einsum("ij,ij->i", fr, fr)  # 프레임별 제곱합 (x**2 임시배열 없음)
+    w = max(1, int(search_sec * sr) // f)
+    cuts, pos = [], 0
+    while len(x) - pos >= block * 3 // 2:
+        c = (pos + block) // f
+        lo, hi = max(pos // f + 1, c - w), min(nf, c + w + 1)
+        if lo >= hi:
+            break
+        pos = (lo + int(np.argmin(energy[lo:hi]))) * f
+        cuts.append(pos)
+    return cuts
+
+_INV32768 = np.float32(1.0 / 32768.0)
+
+def _pcm16_wav_layout(wav_bytes: bytes) -> tuple[int, int, int, int] | None:
+    """RIFF/WAVE PCM16이면 (sr, channels, data_offset, data_len), 아니면 None"""
+    if len(wav_bytes) < 44 or wav_bytes[0:4] != b"RIFF" or wav_bytes[8:12] != b"WAVE":
+        return None
+    off, fmt = 12, None
+    while off + 8 <= len(wav_bytes):
+        cid, size = struct.unpack_from("<4sI", wav_bytes, off)
+        body = off + 8
+        if cid == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", wav_bytes, body)
+        elif cid == b"data":
+            if fmt is None:
+                return None
+            audio_fmt, channels, sr, _, _, bits = fmt
+            if audio_fmt != 1 or bits != 16 or channels < 1:
+                return None
+            return sr, channels, body, min(size, len(wav_bytes) - body)
+        off = body + size + (size & 1)
+    return None
+
+def wav_bytes_to_float32(wav_bytes: bytes) -> tuple[np.ndarray, int]:
+    # VOICEVOX 출력(PCM16)은 헤더만 읽고 바로 디코드, 그 외 포맷은 soundfile로
+    layout = _pcm16_wav_layout(wav_bytes)
+    if layout is None:
+        import soundfile as sf  # 이 경로에서만 필요
+        buf = io.BytesIO(wav_bytes)
+        pcm, sr = sf.read(buf, dtype="float32", always_2d=False)
+        if pcm.ndim == 2:
+            pcm = pcm.mean(axis=1)
+        return pcm, sr
+
+    sr, channels, off, n_bytes = layout
+    n = (n_bytes // (2 * channels)) * channels
+    pcm16 = np.frombuffer(wav_bytes, dtype="<i2", count=n, offset=off)
+    pcm = np.multiply(pcm16, _INV32768, dtype=np.float32)
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return pcm, sr
@@ -0,0 +1,88 @@
+# server/export_rvc_onnx.py
+"""
+RVC 생성기(net_g)를 ONNX로 1회 export → RVCConverter(backend="onnx") / RVC_BACKEND=onnx 에서 사용.
+
+    python -m server.export_rvc_onnx                      # 기본 모델, FP16
+    python -m server.export_rvc_onnx --pth models/rvc/X.pth --fp32
+
+- 출력은 pth 옆의 같은 이름 .onnx (RVCConverter가 찾는 경로)
+- RVC WebUI의 models_onnx.SynthesizerTrnMsNSFsidM 사용 (f0 모델만 지원)
+- FP16 변환 시 LayerNorm/Softmax/Sigmoid 등 수치 민감 연산은 FP32 유지, 입출력 타입도 FP32 유지
+"""
+import argparse
+import os
+
+import torch
+
+from .rvc_wrapper import _prime_rvc_sys_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# FP16에서 오버플로/정밀도 문제가 나기 쉬운 연산 (FP32 유지)
+FP32_OPS = [
+    "LayerNormalization", "ReduceMean", "Pow", "Sqrt", "Softmax", "Sigmoid", "Exp",
+    "RandomNormalLike", "Range", "CumSum",
+]
+
+def export(pth_path: str, onnx_path: str, rvc_root: str, fp16: bool = True, opset: int = 17) -> None:
+    _prime_rvc_sys_path(rvc_root, set_env=True)
+    from infer.lib.infer_pack.models_onnx import SynthesizerTrnMsNSFsidM
+
+    # 1) pth 로드 (RVCConverter와 동일한 config 보정)
+    cpt = torch.load(pth_path, map_location="cpu", weights_only=False)
+    if not cpt.get("f0", 1):
+        raise SystemExit("[EXPORT] f0 없는(nono) 모델은 ONNX 백엔드를 지원하지 않습니다")
+    version = cpt.get("version", "v2")
+    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
+    vec_channels = 256 if version == "v1" else 768
+
+    net_g = SynthesizerTrnMsNSFsidM(*cpt["config"], is_half=False, version=version)
+    net_g.load_state_dict(cpt["weight"], strict=False)
+    net_g.eval()
+
+    # 2) export (프레임 축 dynamic)
+    n = 200
+    dummy = (
+        torch.rand(1, n, vec_channels),             # phone (HuBERT feats)
+        torch.tensor([n], dtype=torch.long),        # phone_lengths
+        torch.randint(5, 255, (1, n), dtype=torch.long),  # pitch (coarse)
+        torch.rand(1, n),                           # pitchf (Hz)
+        torch.tensor([0], dtype=torch.long),        # ds (speaker id)
+        torch.rand(1, 192, n),                      # rnd (flow 노이즈)
+    )
+    input_names = ["phone", "phone_lengths", "pitch", "pitchf", "ds", "rnd"]
+    print(f"[EXPORT] {pth_path} → {onnx_path} (version={version}, opset={opset})")
+    with torch.no_grad():
+        torch.onnx.export(
+            net_g, dummy, onnx_path, opset_version=opset, do_constant_folding=False,
+            input_names=input_names, output_names=["audio"],
+            dynamic_axes={"phone": [1], "pitch": [1], "pitchf": [1], "rnd": [2]},
+        )
+
+    # 3) FP16 변환 (민감 연산/입출력은 FP32)
+    if fp16:
+        import onnx
+        from onnxconverter_common import float16
+        model = onnx.load(onnx_path)
+        model = float16.convert_float_to_float16(
+            model, keep_io_types=True,
+            op_block_list=list(float16.DEFAULT_OP_BLOCK_LIST) + FP32_OPS,
+        )
+        onnx.save(model, onnx_path)
+        print("[EXPORT] Converted to FP16 (sensitive ops kept in FP32)")
+
+    print(f"[EXPORT] Done: {os.path.getsize(onnx_path) / 1e6:.1f} MB")
+
+def main():
+    ap = argparse.ArgumentParser(description="Export RVC net_g to ONNX")
+    ap.add_argument("--pth", default=os.path.join(ROOT, "models", "rvc", "Fern_e300_s1800.pth"))
+    ap.add_argument("--out", default="", help="기본값: pth와 같은 이름의 .onnx")
+    ap.add_argument("--rvc-root", default=os.path.join(ROOT, "third_party", "RVC"))
+    ap.add_argument("--fp32", action="store_true", help="FP16 변환 생략")
+    ap.add_argument("--opset", type=int, default=17)
+    args = ap.parse_args()
+    out = args.out or os.path.splitext(args.pth)[0] + ".onnx"
+    export(args.pth, out, args.rvc_root, fp16=not args.fp32, opset=args.opset)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+/*
+ * server/ext/pcm.c
+ * float32 → PCM16 변환 (노이즈 게이트 + 클립 + 스케일 + int16 팩)을 1패스로.
+ * ws_app.pcm16()이 ctypes로 로드 (없으면 numba → NumPy 순으로 fallback).
+ *
+ * 빌드 (결과물은 이 파일 옆에 두면 됨, *.so는 git 무시):
+ *   Linux/macOS : gcc -O3 -shared -fPIC -o server/ext/pcm.so server/ext/pcm.c
+ *   Windows     : cl /O2 /arch:AVX2 /LD server\ext\pcm.c /Fe:server\ext\pcm.dll
+ *
+ * - GCC/Clang: AVX2 경로는 target 속성으로만 컴파일하고 런타임에 CPU 지원을 확인 (-mavx2 불필요)
+ * - MSVC: /arch:AVX2로 빌드했을 때만 AVX2 경로 포함
+ * - 출력은 일반 store: 변환 직후 송신 버퍼로 바로 다시 읽히므로 캐시를 우회하는 streaming store는 오히려 손해
+ * - 결과는 numba 커널(_f32_to_pcm16_gated)과 동일: NaN → 0, |v| < thr → 0, [-1, 1] 클립(±inf 포함),
+ *   v * 32767을 0 방향 절삭. NaN 검사가 지워지지 않도록 -ffast-math / /fp:fast 없이 빌드
+ */
+#include <stddef.h>
+#include <stdint.h>
+
+#if defined(_WIN32)
+#  define PCM_EXPORT __declspec(dllexport)
+#else
+#  define PCM_EXPORT __attribute__((visibility("default")))
+#endif
+
+/* -DPCM_NO_AVX2: 스칼라 경로만 빌드 (AVX2 결과와 비교하는 테스트용) */
+#if !defined(PCM_NO_AVX2) && (defined(__x86_64__) || defined(__i386__) || defined(_M_X64) || defined(_M_IX86))
+#  if defined(__GNUC__) || defined(__clang__)
+#    define PCM_AVX2 1
+#    define PCM_TARGET_AVX2 __attribute__((target("avx2")))
+#    define PCM_CPU_HAS_AVX2() __builtin_cpu_supports("avx2")
+#  elif defined(_MSC_VER) && defined(__AVX2__)
+#    define PCM_AVX2 1
+#    define PCM_TARGET_AVX2
+#    define PCM_CPU_HAS_AVX2() 1
+#  endif
+#endif
+
+static void convert_scalar(const float *src, size_t n, float thr, int16_t *dst)
+{
+    for (size_t i = 0; i < n; ++i) {
+        float v = src[i];
+        if (v != v || (-thr < v && v < thr))
+            v = 0.0f;
+        else if (v < -1.0f)
+            v = -1.0f;
+        else if (v > 1.0f)
+            v = 1.0f;
+        dst[i] = (int16_t)(v * 32767.0f);
+    }
+}
+
+#ifdef PCM_AVX2
+#include <immintrin.h>
+
+PCM_TARGET_AVX2
+static void convert_avx2(const float *src, size_t n, float thr, int16_t *dst)
+{
+    const __m256 sign = _mm256_set1_ps(-0.0f);
+    const __m256 vthr = _mm256_set1_ps(thr);
+    const __m256 lo = _mm256_set1_ps(-1.0f);
+    const __m256 hi = _mm256_set1_ps(1.0f);
+    const __m256 scale = _mm256_set1_ps(32767.0f);
+    size_t i = 0;
+
+    /* 16샘플씩: float 8개 x 2 → int32 8개 x 2 → int16 16개 */
+    for (; i + 16 <= n; i += 16) {
+        __m256 a = _mm256_loadu_ps(src + i);
+        __m256 b = _mm256_loadu_ps(src + i + 8);
+
+        /* NaN lane을 0으로 (max_ps는 NaN이면 두 번째 피연산자 -1을 돌려줘 -32767이 됨) */
+        a = _mm256_and_ps(a, _mm256_cmp_ps(a, a, _CMP_ORD_Q));
+        b = _mm256_and_ps(b, _mm256_cmp_ps(b, b, _CMP_ORD_Q));
+
+        /* 게이트: |v| < thr인 lane을 0으로 */
+        a = _mm256_andnot_ps(_mm256_cmp_ps(_mm256_andnot_ps(sign, a), vthr, _CMP_LT_OQ), a);
+        b = _mm256_andnot_ps(_mm256_cmp_ps(_mm256_andnot_ps(sign, b), vthr, _CMP_LT_OQ), b);
+
+        /* 클립 + 스케일 + 0 방향 절삭 변환 */
+        a = _mm256_mul_ps(_mm256_min_ps(_mm256_max_ps(a, lo), hi), scale);
+        b = _mm256_mul_ps(_mm256_min_ps(_mm256_max_ps(b, lo), hi), scale);
+        __m256i ia = _mm256_cvttps_epi32(a);
+        __m256i ib = _mm256_cvttps_epi32(b);
+
+        /* packs는 128비트 lane 안에서 섞이므로 64비트 단위로 순서 복원 */
+        __m256i p = _mm256_packs_epi32(ia, ib);
+        p = _mm256_permute4x64_epi64(p, 0xD8);
+        _mm256_storeu_si256((__m256i *)(dst + i), p);
+    }
+    convert_scalar(src + i, n - i, thr, dst + i);
+}
+#endif
+
+PCM_EXPORT void convert_and_frame(const float *src, size_t n, float thr, int16_t *dst)
+{
+#ifdef PCM_AVX2
+    if (PCM_CPU_HAS_AVX2()) {
+        convert_avx2(src, n, thr, dst);
+        return;
+    }
+#endif
+    convert_scalar(src, n, thr, dst);
+}
@@ -0,0 +1,137 @@
+# server/pipeline.py
+"""
+텍스트 → 피스 분할/병합과 피스 단위 synth → convert → emit 파이프라인 (ws_app에서 사용).
+표준 라이브러리만 사용: 모델/HTTP 클라이언트 없이 단독으로 import·테스트 가능
+"""
+import asyncio, re
+from typing import Awaitable, Callable, List, Optional
+
+# slice_text / 버퍼 경계 판정용 패턴 (모듈 로드 시 1회 컴파일)
+_PUNCT_SPLIT = re.compile(r'([。！？!?、,])')
+_PUNCT_STRIP_RE = re.compile(r'[。！？!?、,\s]')
+_PUNCT_END_RE = re.compile(r'[。！？!?、,.\n]$')
+_PUNCT_CHARS = frozenset("。！？!?、,")
+
+def _is_synth_worthy(piece: str) -> bool:
+    """구두점/공백을 뺀 글자가 2자 이상일 때만 VOICEVOX 합성 (그 미만은 거의 무음 → HTTP + RVC 낭비)"""
+    return len(_PUNCT_STRIP_RE.sub('', piece)) >= 2
+
+# 첫 피스 뒤의 짧은 피스들은 합쳐서 VOICEVOX/RVC 1회로 (피스당 HTTP 2회 + RVC 고정비용 절감)
+# 구두점/공백 뺀 글자 수 기준 상한 (~3초 분량), 0이면 병합 안 함
+PIECE_MERGE_CHARS = 24
+
+def merge_short_pieces(pieces: List[str], max_chars: int = PIECE_MERGE_CHARS) -> List[str]:
+    """
+    첫 피스는 첫 오디오 지연을 위해 그대로 두고, 나머지는 합친 길이가 max_chars 이하인 동안 이어붙임.
+    구두점은 피스 끝에 남아 있으므로 VOICEVOX가 그 자리에서 쉼을 넣음 (출력을 다시 자를 필요 없음)
+    """
+    if max_chars <= 0 or len(pieces) <= 2:
+        return pieces
+    merged = [pieces[0]]
+    buf, buf_len = "", 0
+    for piece in pieces[1:]:
+        n = len(_PUNCT_STRIP_RE.sub('', piece))
+        if buf and buf_len + n > max_chars:
+            merged.append(buf)
+            buf, buf_len = "", 0
+        buf += piece
+        buf_len += n
+    if buf:
+        merged.append(buf)
+    return merged
+
+def slice_text(s: str) -> List[str]:
+    """구두점 기준으로 자연스럽게 쪼개기 (VOICEVOX 품질 보장)"""
+    # 구두점으로 분할하되 구두점을 앞 문장에 포함시킴
+    parts = _PUNCT_SPLIT.split(s)
+    merged, buf = [], ""
+
+    for i, part in enumerate(parts):
+        buf += part
+
+        # 구두점일 때만 분할 (자연스러운 문장 단위)
+        if part in _PUNCT_CHARS:
+            if buf.strip():  # 빈 문자열이 아닐 때만 추가
+                merged.append(buf.strip())
+            buf = ""
+
+    # 마지막 남은 부분
+    if buf.strip():
+        merged.append(buf.strip())
+
+    # 구두점만 있는 피스들 제거
+    result = []
+    for piece in merged:
+        # 구두점과 공백만 있는 피스는 제외
+        if _PUNCT_STRIP_RE.sub('', piece):
+            result.append(piece)
+
+    return result
+
+# 피스 파이프라인: VOICEVOX 동시 요청 수 / 스테이지 간 큐 깊이
+VV_CONCURRENCY = 3
+PIPE_DEPTH = 4
+
+async def pipeline_pieces(pieces: List[str],
+                          synth: Callable[[int, str], Awaitable[Optional[object]]],
+                          convert: Callable[[int, object], Awaitable[Optional[object]]],
+                          emit: Callable[[int, object], Awaitable[None]]) -> None:
+    """
+    synth(VOICEVOX) → convert(RVC) → emit(송출) 3단 파이프라인.
+    합성은 세마포어 한도 내에서 동시에, 변환/송출은 원래 순서대로 진행되어
+    RVC가 N번째 피스를 처리하는 동안 N+1번째 합성이 이미 돌아간다.
+    synth/convert가 None을 반환하면 해당 피스는 건너뛴다.
+    """
+    vv_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPE_DEPTH)
+    out_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPE_DEPTH)
+    sem = asyncio.Semaphore(VV_CONCURRENCY)
+    done = {}
+    next_idx = 0
+
+    async def vv_one(idx, piece):
+        nonlocal next_idx
+        async with sem:
+            done[idx] = await synth(idx, piece)
+        # 완료 순서와 무관하게 인덱스 순서대로만 큐에 넣음
+        while next_idx in done:
+            await vv_queue.put((next_idx, done.pop(next_idx)))
+            next_idx += 1
+
+    async def vv_worker():
+        vv_tasks = [asyncio.create_task(vv_one(i, p)) for i, p in enumerate(pieces)]
+        try:
+            await asyncio.gather(*vv_tasks)
+        finally:
+            # 합성 하나가 실패해도 gather는 형제 태스크를 취소하지 않음 → 남은 VOICEVOX 호출/put 대기를 직접 정리
+            for t in vv_tasks:
+                t.cancel()
+            await asyncio.gather(*vv_tasks, return_exceptions=True)
+        await vv_queue.put(None)
+
+    async def rvc_worker():
+        while True:
+            item = await vv_queue.get()
+            if item is None:
+                break
+            idx, res = item
+            if res is not None:
+                res = await convert(idx, res)
+            if res is not None:
+                await out_queue.put((idx, res))
+        await out_queue.put(None)
+
+    async def stream_worker():
+        while True:
+            item = await out_queue.get()
+            if item is None:
+                break
+            await emit(*item)
+
+    tasks = [asyncio.create_task(c) for c in (vv_worker(), rvc_worker(), stream_worker())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # 한 스테이지가 실패하면 나머지가 큐에서 영원히 대기하지 않도록 정리
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,129 @@
+# server/rvc_proc.py
+"""
+RVCConverter를 별도 프로세스(spawn)에서 돌리는 워커 (RVC_WORKER=process).
+
+- 메인 프로세스의 GIL/이벤트 루프와 완전히 분리 (HuBERT/RMVPE 전처리의 CPU 구간 포함)
+- CUDA 때문에 fork 대신 spawn, 워커는 1개 (GPU 접근 직렬화)
+- 이 모듈은 ws_app을 import하지 않음: spawn 자식이 앱/모델을 다시 띄우지 않도록
+- PCM은 SharedMemory 슬롯 링으로 주고받고 (slot, 길이, sr)만 보냄 → 피스당 pickle 왕복 없음.
+  빈 슬롯이 없거나 슬롯보다 긴 입력/출력이면 기존처럼 배열을 pickle
+"""
+import multiprocessing as mp
+import queue
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from contextlib import suppress
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+# 슬롯 링: 슬롯 수 x (SHM_SLOT_SEC초 @48kHz float32) ≈ 4 x 3.8MB
+SHM_SLOTS = 4
+SHM_SLOT_SEC = 20
+SHM_SLOT_SAMPLES = SHM_SLOT_SEC * 48000
+_SLOT_BYTES = SHM_SLOT_SAMPLES * 4
+
+def _slot_view(shm: SharedMemory, slot: int, n: int) -> np.ndarray:
+    return np.ndarray((n,), dtype=np.float32, buffer=shm.buf, offset=slot * _SLOT_BYTES)
+
+# ---- 자식 프로세스 쪽 ----
+_kwargs = None
+_rvc = None
+_shm = None
+
+def _init(kwargs: dict, shm_name: str):
+    global _kwargs, _shm
+    _kwargs = kwargs
+    try:
+        _shm = SharedMemory(name=shm_name, track=False)  # 3.13+
+    except TypeError:
+        # 3.12 이하: attach만 해도 resource_tracker에 등록돼 종료 시 경고/조기 unlink → 해제는 부모 담당
+        from multiprocessing import resource_tracker
+        _shm = SharedMemory(name=shm_name)
+        resource_tracker.unregister(_shm._name, "shared_memory")
+
+def _get():
+    # 모델 로드는 첫 호출에서 (initializer에서 실패하면 원인 메시지 없이 BrokenProcessPool만 남음)
+    global _rvc
+    if _rvc is None:
+        from .rvc_wrapper import RVCConverter
+        _rvc = RVCConverter(**_kwargs)
+    return _rvc
+
+def _info() -> dict:
+    rvc = _get()
+    return {"tgt_sr": rvc.tgt_sr, "warmup_runs": getattr(rvc, "warmup_runs", 1)}
+
+def _convert(pcm: np.ndarray, sr: int, normalize: bool = True):
+    return _get().convert(pcm, sr=sr, normalize=normalize)
+
+def _convert_shm(slot: int, n: int, sr: int, normalize: bool = True):
+    """슬롯의 입력을 변환해 같은 슬롯에 출력 기록 → (출력 길이, out_sr, 슬롯에 안 들어가면 배열)"""
+    conv, out_sr = _get().convert(_slot_view(_shm, slot, n), sr=sr, normalize=normalize)  # convert는 입력을 수정하지 않음
+    m = int(conv.shape[0])
+    if m > SHM_SLOT_SAMPLES:
+        return m, out_sr, conv
+    _slot_view(_shm, slot, m)[:] = conv
+    return m, out_sr, None
+
+# ---- 메인 프로세스 쪽 ----
+class RVCProcess:
+    """RVCConverter 대역: convert()/submit()을 워커 프로세스로 위임 (생성 시 모델 로드까지 대기)"""
+
+    def __init__(self, **kwargs):
+        self._shm = SharedMemory(create=True, size=SHM_SLOTS * _SLOT_BYTES)
+        self._free: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+        for i in range(SHM_SLOTS):
+            self._free.put(i)
+        self.pool = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"),
+                                        initializer=_init, initargs=(kwargs, self._shm.name))
+        try:
+            info = self.pool.submit(_info).result()
+        except Exception:
+            self.shutdown()
+            raise
+        self.tgt_sr = info["tgt_sr"]
+        self.warmup_runs = info["warmup_runs"]
+
+    def submit(self, pcm: np.ndarray, sr: int, normalize: bool = True) -> Future:
+        n = int(pcm.shape[0])
+        slot = None
+        if pcm.ndim == 1 and n <= SHM_SLOT_SAMPLES:
+            with suppress(queue.Empty):
+                slot = self._free.get_nowait()
+        if slot is None:
+            return self.pool.submit(_convert, pcm, sr, normalize)
+
+        _slot_view(self._shm, slot, n)[:] = pcm
+        out: Future = Future()
+
+        def _done(f: Future):
+            # 워커가 슬롯을 다 쓴 뒤에만 반납 (호출 측이 먼저 취소했어도)
+            try:
+                m, out_sr, conv = f.result()
+                if conv is None:
+                    conv = _slot_view(self._shm, slot, m).copy()
+                with suppress(InvalidStateError):
+                    out.set_result((conv, out_sr))
+            except BaseException as e:
+                with suppress(InvalidStateError):
+                    out.set_exception(e)
+            finally:
+                self._free.put(slot)
+
+        try:
+            inner = self.pool.submit(_convert_shm, slot, n, sr, normalize)
+        except Exception:
+            self._free.put(slot)
+            raise
+        inner.add_done_callback(_done)
+        return out
+
+    def convert(self, pcm: np.ndarray, sr: int, normalize: bool = True):
+        return self.submit(pcm, sr, normalize).result()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        with suppress(Exception):
+            self._shm.unlink()
+        with suppress(Exception):
+            self._shm.close()
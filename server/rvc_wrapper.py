@@ -1,9 +1,12 @@
 # server/rvc_wrapper.py
 from contextlib import nullcontext
-import os, sys, logging
-from typing import Tuple, Set
+import os, sys, logging, math, threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Tuple, Set, Dict, Sequence, Union
 import numpy as np
-import librosa
+from numpy.lib.stride_tricks import sliding_window_view
 import torch
 import importlib
 import importlib.util
@@ -15,8 +18,34 @@ try:
     _HAS_TA = True
 except Exception:
     _HAS_TA = False
+try:
+    import soxr
+    _HAS_SOXR = True
+except Exception:
+    _HAS_SOXR = False
+try:
+    import torchcrepe
+    _HAS_CREPE = True
+except Exception:
+    _HAS_CREPE = False
+try:
+    import bitsandbytes as bnb
+    _HAS_BNB = True
+except Exception:
+    _HAS_BNB = False
+try:
+    import onnxruntime as ort
+    _HAS_ORT = True
+except Exception:
+    _HAS_ORT = False
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except Exception:
+    _HAS_NUMBA = False
 
 log = logging.getLogger("rvc_wrapper")
+log.setLevel(logging.INFO)  # debug 로그는 기본 생략 (핫패스에서 포맷팅/stdout flush 없음)
 
 def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
     """
@@ -41,7 +70,7 @@ def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
 
     for module_name in modules_to_remove:
         del sys.modules[module_name]
-        print(f"[RVC] Removed module: {module_name}")
+        log.debug("[RVC] Removed module: %s", module_name)
 
     # 2) sys.path 완전히 정리하고 다시 설정
     paths_to_remove = []
@@ -59,7 +88,8 @@ def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
     if os.path.isdir(lib_dir):
         sys.path.insert(2, lib_dir)
 
-    print(f"[RVC] sys.path updated: {[p for p in sys.path[:5] if 'RVC' in p]}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[RVC] sys.path updated: %s", [p for p in sys.path[:5] if 'RVC' in p])
 
     # 4) 환경변수 설정 (강제로 모든 변형 설정)
     if set_env:
@@ -77,7 +107,7 @@ def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
         for k, v in env_vars.items():
             os.environ[k] = v.replace("\\", "/")
 
-        print(f"[RVC] Set environment variables: {list(env_vars.keys())}")
+        log.debug("[RVC] Set environment variables: %s", list(env_vars.keys()))
 
     # 5) importlib 캐시 무효화
     importlib.invalidate_caches()
@@ -91,7 +121,7 @@ def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
 
         module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(module)
-        print("[RVC] Pipeline module loaded successfully")
+        log.debug("[RVC] Pipeline module loaded successfully")
 
     except Exception as e:
         raise ImportError(
@@ -102,6 +132,76 @@ def _prime_rvc_sys_path(rvc_root: str, set_env: bool = True) -> str:
 
     return r
 
+def _frame_energy_np(y: np.ndarray, n: int, hop: int) -> np.ndarray:
+    """프레임별 평균 제곱(RMS^2). sliding window view + 1회 reduction"""
+    win = sliding_window_view(y, n)[::hop]
+    return np.mean(np.square(win, dtype=np.float64), axis=1)
+
+if _HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _frame_energy(y, n, hop):
+        """프레임별 평균 제곱(RMS^2). y를 한 번만 훑고 (N/hop) 크기 출력만 할당"""
+        num = (y.shape[0] - n) // hop + 1
+        out = np.empty(num, dtype=np.float64)
+        for j in range(num):
+            i = j * hop
+            s = 0.0
+            for k in range(n):
+                v = y[i + k]
+                s += v * v
+            out[j] = s / n
+        return out
+else:
+    _frame_energy = _frame_energy_np
+
+def _dc_peak_clean_np(src: np.ndarray, dst: np.ndarray, remove_dc: bool, limit: float) -> np.ndarray:
+    """
+    NaN/Inf → 0 후 (DC 제거) + peak > limit 이면 limit로 스케일. dst는 src와 같아도 됨.
+    평균/피크는 유한값만으로 계산 (numba 커널과 같은 정책)
+    """
+    if dst is not src:
+        dst[...] = src
+    with np.errstate(invalid="ignore"):  # inf + -inf
+        total = float(dst.sum(dtype=np.float64))
+    # NaN/Inf가 하나라도 있으면 합이 비유한값 → 그때만 전체 정리
+    if not math.isfinite(total):
+        np.nan_to_num(dst, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        total = float(dst.sum(dtype=np.float64))
+    if remove_dc and dst.size:
+        dst -= dst.dtype.type(total / dst.size)
+    peak = float(np.max(np.abs(dst))) if dst.size else 0.0
+    if peak > limit:
+        dst *= limit / peak
+    return dst
+
+if _HAS_NUMBA:
+    # fastmath 중 nnan/ninf는 제외 (isfinite 검사가 최적화로 사라지지 않도록)
+    _FASTMATH_FINITE = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+    @njit(cache=True, fastmath=_FASTMATH_FINITE)
+    def _dc_peak_clean(src, dst, remove_dc, limit):
+        """_dc_peak_clean_np와 동일 동작을 배열 3회 순회(정리+합/피크/쓰기)로 임시배열 없이 처리"""
+        n = src.shape[0]
+        s = 0.0
+        for i in range(n):
+            v = src[i]
+            if not np.isfinite(v):
+                v = 0.0
+            dst[i] = v
+            s += v
+        m = s / n if remove_dc and n > 0 else 0.0
+        p = 0.0
+        for i in range(n):
+            a = abs(dst[i] - m)
+            if a > p:
+                p = a
+        scale = limit / p if p > limit else 1.0
+        for i in range(n):
+            dst[i] = (dst[i] - m) * scale
+        return dst
+else:
+    _dc_peak_clean = _dc_peak_clean_np
+
 def snr_segmental(y: np.ndarray, sr: int, win_ms: int = 20, thr_ratio: float = 0.15) -> float:
     """
     - 20ms 프레임, 50% 겹침
@@ -118,16 +218,11 @@ def snr_segmental(y: np.ndarray, sr: int, win_ms: int = 20, thr_ratio: float = 0
     if peak > 1.0: y = y / peak
 
     n = int(sr * win_ms / 1000)
-    hop = n // 2
-    if n < 1: return float("nan")
-
-    # 프레임 RMS
-    frames = []
-    for i in range(0, len(y) - n + 1, hop):
-        f = y[i:i+n]
-        rms2 = float(np.mean(f*f)) + 1e-12
-        frames.append(rms2)
-    frames = np.array(frames, dtype=np.float64)
+    hop = max(n // 2, 1)
+    if n < 1 or len(y) < n: return float("nan")
+
+    # 프레임 RMS (numba 있으면 JIT 커널, 없으면 NumPy 벡터화)
+    frames = _frame_energy(y, n, hop) + 1e-12
     if frames.size < 4: return float("nan")
 
     med = np.median(frames)
@@ -140,6 +235,206 @@ def snr_segmental(y: np.ndarray, sr: int, win_ms: int = 20, thr_ratio: float = 0
     signal_power = float(np.mean(frames[~noise_mask]))
     return 10.0 * np.log10(signal_power / noise_power)
 
+class _OrtRMVPENet:
+    """
+    RMVPE E2E 네트워크(mel → hidden)를 onnxruntime CUDA EP로 실행하는 드롭인 callable.
+    - RMVPE.mel2hidden이 self.model(mel)로 호출하는 자리에 그대로 끼움
+    - IO binding으로 torch CUDA 텐서를 복사 없이 입력, 출력 텐서는 프레임 길이별로 재사용
+    """
+    def __init__(self, onnx_path: str, device: torch.device):
+        self.device = device
+        self.device_id = device.index if device.index is not None else torch.cuda.current_device()
+        self.sess = ort.InferenceSession(
+            onnx_path,
+            providers=[("CUDAExecutionProvider", {"device_id": self.device_id}), "CPUExecutionProvider"],
+        )
+        self.in_name = self.sess.get_inputs()[0].name
+        self.out_name = self.sess.get_outputs()[0].name
+        self._outs: Dict[int, torch.Tensor] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def export(model: torch.nn.Module, onnx_path: str) -> None:
+        """RMVPE E2E를 fp32 ONNX로 1회 export (시간축 dynamic, mel 128bin)"""
+        import copy
+        m = copy.deepcopy(model).float().cpu().eval()
+        dummy = torch.zeros(1, 128, 32 * 4, dtype=torch.float32)
+        torch.onnx.export(
+            m, dummy, onnx_path, opset_version=17,
+            input_names=["mel"], output_names=["hidden"],
+            dynamic_axes={"mel": {2: "n_frames"}, "hidden": {1: "n_frames"}},
+        )
+
+    def __call__(self, mel: torch.Tensor) -> torch.Tensor:
+        mel = mel.to(self.device, dtype=torch.float32).contiguous()
+        n_frames = int(mel.shape[-1])
+        with self._lock:
+            out = self._outs.get(n_frames)
+            if out is None:
+                out = torch.empty((1, n_frames, 360), dtype=torch.float32, device=self.device)
+                self._outs[n_frames] = out
+            binding = self.sess.io_binding()
+            binding.bind_input(self.in_name, "cuda", self.device_id, np.float32, tuple(mel.shape), mel.data_ptr())
+            binding.bind_output(self.out_name, "cuda", self.device_id, np.float32, tuple(out.shape), out.data_ptr())
+            torch.cuda.current_stream().synchronize()  # mel 계산 완료 후 ORT 스트림에서 읽도록
+            self.sess.run_with_iobinding(binding)
+            return out.clone()
+
+class _OrtNetG:
+    """
+    net_g.infer 자리에 끼우는 onnxruntime(CUDA EP) 생성기 백엔드 (f0 모델 전용).
+    - export_rvc_onnx.py가 만든 그래프: (phone, phone_lengths, pitch, pitchf, ds, rnd) → audio
+    - CUDA: IO binding으로 torch 텐서를 복사 없이 입력 (출력 크기는 ORT가 할당)
+    - pipeline이 infer(...)[0][0, 0]로 쓰므로 (audio[1, 1, T],) 튜플 반환
+    """
+    def __init__(self, onnx_path: str, device: torch.device, net_g=None):
+        self.device = device
+        self.net_g = net_g
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if device.type == "cuda":
+            self.device_id = device.index if device.index is not None else torch.cuda.current_device()
+            providers = [("CUDAExecutionProvider", {"device_id": self.device_id}), "CPUExecutionProvider"]
+        else:
+            self.device_id = 0
+            providers = ["CPUExecutionProvider"]
+        self.sess = ort.InferenceSession(onnx_path, opts, providers=providers)
+        self.in_names = [i.name for i in self.sess.get_inputs()]
+        self.out_name = self.sess.get_outputs()[0].name
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # infer 외 속성(emb_g 등)은 원본 torch net_g로 위임
+        net_g = self.__dict__.get("net_g")
+        if net_g is None:
+            raise AttributeError(name)
+        return getattr(net_g, name)
+
+    def infer(self, phone, phone_lengths, pitch, nsff0, sid, *args, **kwargs):
+        # ONNX 그래프는 flow 노이즈를 입력으로 받음 (torch infer의 randn_like(m_p) * 0.66666과 동일)
+        rnd = torch.randn(1, 192, int(phone.shape[1]), device=phone.device) * 0.66666
+        feeds = [
+            phone.to(self.device, dtype=torch.float32).contiguous(),
+            phone_lengths.to(self.device, dtype=torch.int64).contiguous(),
+            pitch.to(self.device, dtype=torch.int64).contiguous(),
+            nsff0.to(self.device, dtype=torch.float32).contiguous(),
+            sid.to(self.device, dtype=torch.int64).contiguous(),
+            rnd.to(self.device, dtype=torch.float32).contiguous(),
+        ]
+        with self._lock:
+            if self.device.type == "cuda":
+                binding = self.sess.io_binding()
+                for name, t in zip(self.in_names, feeds):
+                    np_dtype = np.int64 if t.dtype == torch.int64 else np.float32
+                    binding.bind_input(name, "cuda", self.device_id, np_dtype, tuple(t.shape), t.data_ptr())
+                binding.bind_output(self.out_name, "cuda", self.device_id)
+                torch.cuda.current_stream().synchronize()  # 입력 텐서 계산 완료 후 ORT가 읽도록
+                self.sess.run_with_iobinding(binding)
+                audio = binding.copy_outputs_to_cpu()[0]
+            else:
+                audio = self.sess.run([self.out_name],
+                                      {n: t.numpy() for n, t in zip(self.in_names, feeds)})[0]
+        audio = torch.from_numpy(np.asarray(audio, dtype=np.float32))
+        return (audio.reshape(1, 1, -1),)
+
+def _map_tensors(fn, obj):
+    """tuple/list 중첩 구조 안의 텐서에만 fn 적용"""
+    if torch.is_tensor(obj):
+        return fn(obj)
+    if isinstance(obj, (tuple, list)):
+        return type(obj)(_map_tensors(fn, o) for o in obj)
+    return obj
+
+def _quantize_hubert_int8(hubert, device: torch.device):
+    """
+    HuBERT Linear 가중치를 int8로 (CPU: 동적 양자화, CUDA: bitsandbytes Linear8bitLt).
+    - self_attn의 q/k/v/out_proj는 제외: fairseq MHA가 F.multi_head_attention_forward에
+      .weight를 직접 넘기므로 양자화 모듈로 바꾸면 동작하지 않음 → FFN(fc1/fc2)/projection만 대상
+    - 양자화 후에는 .float()/.half()를 다시 호출하지 말 것
+    """
+    names = [n for n, m in hubert.named_modules()
+             if isinstance(m, torch.nn.Linear) and "self_attn" not in n.split(".")]
+    if not names:
+        return hubert
+
+    if device.type == "cpu":
+        from torch.ao.quantization import quantize_dynamic
+        hubert = quantize_dynamic(hubert, set(names), dtype=torch.qint8)
+    elif device.type == "cuda" and _HAS_BNB:
+        for name in names:
+            parent_name, _, attr = name.rpartition(".")
+            parent = hubert.get_submodule(parent_name) if parent_name else hubert
+            lin = getattr(parent, attr)
+            q = bnb.nn.Linear8bitLt(lin.in_features, lin.out_features, bias=lin.bias is not None,
+                                    has_fp16_weights=False, threshold=6.0)
+            q.weight = bnb.nn.Int8Params(lin.weight.data.half().cpu(), requires_grad=False, has_fp16_weights=False)
+            if lin.bias is not None:
+                q.bias = torch.nn.Parameter(lin.bias.data.half(), requires_grad=False)
+            setattr(parent, attr, q.to(device))  # .to(cuda) 시점에 int8로 양자화됨
+    else:
+        log.warning("HuBERT int8 requested but unsupported on %s (bitsandbytes=%s); keeping float", device, _HAS_BNB)
+        return hubert
+
+    log.debug("[RVC] HuBERT int8: quantized %d Linear layers on %s", len(names), device.type)
+    return hubert.eval()
+
+class _CUDAGraphInfer:
+    """
+    net_g.infer를 입력 shape별 CUDA Graph로 캡처/재생하는 래퍼.
+    - 버킷팅으로 입력 길이가 유한 집합일 때만 사용 (shape마다 그래프 1개)
+    - 새 shape 첫 호출(보통 warm_bucket)에서 캡처, 이후 동일 shape는 replay
+    - 캡처 실패/키워드 인자 호출/최대 개수 초과 시 eager로 실행
+    """
+    def __init__(self, net_g, max_graphs: int = 16):
+        self.net_g = net_g
+        self.max_graphs = int(max_graphs)
+        self._graphs: Dict[tuple, tuple | None] = {}
+        self._pool = torch.cuda.graph_pool_handle()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.net_g, name)
+
+    def _capture(self, args):
+        static_in = [a.clone() for a in args]
+        # 캡처 전 side stream에서 1회 워밍 (cuDNN 알고리즘 선택/메모리 확보)
+        s = torch.cuda.Stream()
+        s.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(s):
+            self.net_g.infer(*static_in)
+        torch.cuda.current_stream().wait_stream(s)
+
+        g = torch.cuda.CUDAGraph()
+        # autocast 캐시는 그래프 캡처와 호환되지 않음
+        with torch.autocast(device_type="cuda", dtype=torch.float16,
+                            enabled=torch.is_autocast_enabled(), cache_enabled=False):
+            with torch.cuda.graph(g, pool=self._pool):
+                static_out = self.net_g.infer(*static_in)
+        return g, static_in, static_out
+
+    def infer(self, *args, **kwargs):
+        if kwargs or not all(torch.is_tensor(a) for a in args):
+            return self.net_g.infer(*args, **kwargs)
+        key = tuple((tuple(a.shape), a.dtype) for a in args)
+        with self._lock:
+            if key not in self._graphs:
+                if len(self._graphs) >= self.max_graphs:
+                    return self.net_g.infer(*args)
+                try:
+                    self._graphs[key] = self._capture(args)
+                    log.debug("[RVC] Captured CUDA graph for net_g.infer %s", key)
+                except Exception as e:
+                    log.warning("CUDA graph capture failed, using eager net_g: %s", e)
+                    self._graphs[key] = None
+            entry = self._graphs[key]
+            if entry is None:
+                return self.net_g.infer(*args)
+            g, static_in, static_out = entry
+            for dst, src in zip(static_in, args):
+                dst.copy_(src)
+            g.replay()
+            return _map_tensors(lambda t: t.clone(), static_out)
+
 class RVCConverter:
     """
     RVC(WebUI) 최신 구조 전용 보이스 변환기.
@@ -153,16 +448,23 @@ class RVCConverter:
         index_path: str = "",       # 예: ../models/rvc/speaker.index (없으면 "")
         device: str = "cuda",
         input_sr: int = 24000,
-        f0_method: str = "rmvpe",   # "rmvpe" | "crepe" | "harvest" | "dio"
+        f0_method: str = "rmvpe",   # "rmvpe" | "crepe" | "torchcrepe"(tiny, GPU) | "harvest" | "dio"
         index_rate: float = 0.5,
         protect: float = 0.33,
         filter_radius: int = 3,
         rms_mix_rate: float = 0.25,
         f0_up_key: int = 0,
         resample_sr: int = 0,
-        is_half: bool = False,
+        is_half: Union[bool, str] = False,  # "auto": CUDA compute capability >= 7.0(텐서코어)일 때만 FP16
         bucketing: bool = True,
         bucket_ms: int = 500,
+        bucket_ladder_ms: Sequence[int] = (500, 1000, 1500, 2000, 3000, 4000),
+        cuda_graphs: bool = False,
+        hubert_int8: bool = False,
+        rmvpe_onnx: bool = False,
+        backend: str = "torch",     # "torch" | "onnx" (pth 옆의 <name>.onnx, export_rvc_onnx.py로 생성)
+        torch_compile: bool = False,  # net_g.infer/RMVPE를 torch.compile(reduce-overhead) (수동 CUDA Graph와 배타)
+        stage_sec: float = 0.0,     # H2D 스테이징 버퍼 길이(초 @input_sr). 0이면 최대 버킷(없으면 4초)
     ):
         self.device       = torch.device(device if torch.cuda.is_available() else "cpu")
         self.input_sr     = int(input_sr)
@@ -174,11 +476,34 @@ class RVCConverter:
         self.rms_mix_rate = float(rms_mix_rate)
         self.f0_up_key    = int(f0_up_key)
         self.resample_sr  = int(resample_sr)
-        self.is_half      = bool(is_half)
+        self.is_half      = self._resolve_half(is_half)
         self.bucketing = bool(bucketing)
         self.bucket_ms = int(bucket_ms)
         self.bucket_samples = int(16000 * (self.bucket_ms / 1000.0)) if (self.bucketing and self.bucket_ms > 0) else 0
+        # 짧은 발화용 기하급수형 버킷 사다리(16k 샘플 기준). 최대치를 넘으면 bucket_samples 배수로 올림
+        self.bucket_ladder = sorted({int(16000 * ms / 1000) for ms in bucket_ladder_ms if ms > 0}) if self.bucketing else []
         self._warmed_buckets: Set[int] = set()
+        self._warm_lock = threading.Lock()
+        # 입력 sr별 16k 리샘플러 캐시 (sinc 커널 계수는 최초 1회만 계산)
+        self._resamplers: Dict[int, "torchaudio.transforms.Resample"] = {}
+
+        # 버킷별 패딩 버퍼 (사다리 길이만, 0으로 초기화 후 재사용) + 직전 사용 길이
+        self._infer_lock = threading.Lock()
+        self._pad_bufs: Dict[int, np.ndarray] = {}
+        self._pad_used: Dict[int, int] = {}
+
+        # H2D 스테이징 버퍼 (pinned host + 상주 device, stage_sec 또는 최대 버킷 길이 @input_sr로 할당)
+        # 더 긴 입력이 오면 1초 단위로 올려 재할당 (이후 같은 길이까지는 재사용)
+        # 복사는 non_blocking이지만 convert 호출은 직렬이고 끝에서 host 동기화하므로 다른 GPU 작업과 겹치지는 않음
+        self._stage_lock = threading.Lock()
+        self._h_stage = self._d_stage = None
+        if _HAS_TA and self.device.type == "cuda":
+            if stage_sec > 0:
+                max_in = int(math.ceil(stage_sec * self.input_sr))
+            else:
+                max_16k = self.bucket_ladder[-1] if self.bucket_ladder else 16000 * 4
+                max_in = int(math.ceil(max_16k * self.input_sr / 16000))
+            self._alloc_stage(max_in)
 
         # 1) sys.path 준비
         self.rvc_root = _prime_rvc_sys_path(rvc_root, set_env=True)
@@ -250,6 +575,28 @@ class RVCConverter:
         net_g.eval().to(self.device)
         self.net_g = net_g.half() if (self.is_half and self.device.type == "cuda") else net_g.float()
 
+        # 생성기 백엔드: onnx면 ORT 세션을 net_g 자리에 (실패/미지원 시 torch 유지)
+        self.backend = "torch"
+        onnx_net = self._load_onnx_net_g(pth_path) if backend == "onnx" else None
+
+        # torch.compile: reduce-overhead가 자체 CUDA Graph를 쓰므로 켜지면 수동 캡처는 끔
+        self.torch_compile = bool(torch_compile) and hasattr(torch, "compile") and onnx_net is None
+        if torch_compile and not self.torch_compile:
+            log.warning("torch_compile requested but unavailable (torch.compile=%s, backend=%s); running eager",
+                        hasattr(torch, "compile"), self.backend)
+        # 첫 호출(shape별) 컴파일/그래프 기록이 느리므로 워밍은 여러 번
+        self.warmup_runs = 3 if self.torch_compile else 1
+
+        # 버킷별 고정 shape → net_g.infer를 CUDA Graph로 재생 (bucketing + cuda + torch 백엔드일 때만)
+        self.cuda_graphs = (bool(cuda_graphs) and self.bucketing and self.device.type == "cuda"
+                            and onnx_net is None and not self.torch_compile)
+        if onnx_net is not None:
+            self._infer_net = onnx_net
+        elif self.cuda_graphs:
+            self._infer_net = _CUDAGraphInfer(self.net_g, max_graphs=len(self.bucket_ladder) + 8)
+        else:
+            self._infer_net = self.net_g
+
         # 5) HuBERT 로드
         from torch.serialization import add_safe_globals, safe_globals
         from fairseq.data.dictionary import Dictionary as FairseqDictionary
@@ -261,6 +608,8 @@ class RVCConverter:
         hubert_path = os.path.join(self.rvc_root, "assets", "hubert", "hubert_base.pt")
         models, _, _ = checkpoint_utils.load_model_ensemble_and_task([hubert_path], suffix="", strict=False)
         self.hubert = models[0].to(self.device).eval().float()
+        if hubert_int8:
+            self.hubert = _quantize_hubert_int8(self.hubert, self.device)
 
         # 6) 최신 파이프라인 인스턴스
         import multiprocessing
@@ -297,156 +646,343 @@ class RVCConverter:
         # (C) 파이프라인 생성
         self.pipeline = RVC_Pipeline(self.tgt_sr, cfg)
 
-        # (D) 최종 환경변수 확인 및 강제 설정
+        # (C-1) RMVPE CNN을 onnxruntime(CUDA EP)로 실행
+        if rmvpe_onnx:
+            self._install_rmvpe_onnx(dev_str)
+
+        # (C-2) torch.compile: 생성기 + RMVPE E2E (onnx로 바뀐 쪽은 건너뜀)
+        if self.torch_compile:
+            self._install_torch_compile(dev_str)
+
+        # (C-3) torchcrepe(tiny) F0: 파이프라인 get_f0를 감싸서 GPU 배치 추론으로 대체
+        if self.f0_method == "torchcrepe":
+            self._install_torchcrepe_f0()
+
+        # (D) 최종 환경변수 확인 및 강제 설정 + import 캐시 무효화
+        #     (convert/warm_bucket 핫패스에서는 다시 하지 않음. 경로는 모두 절대경로라 chdir 불필요)
         for k, v in self._env_backup.items():
             os.environ[k] = v
-        print(f"[RVC] Final environment check - all vars set: {list(self._env_backup.keys())}")
-
-    def _bucket_len(self, n: int) -> int:
-        """입력 샘플 길이 n을 버킷 경계(올림)로 정규화"""
-        if not self.bucketing or self.bucket_samples <= 0:
-            return n
-        bs = self.bucket_samples
-        return ((n + bs - 1) // bs) * bs
+        importlib.invalidate_caches()
+        log.debug("[RVC] Final environment check - all vars set: %s", list(self._env_backup.keys()))
+
+    def _load_onnx_net_g(self, pth_path: str):
+        """pth와 같은 이름의 .onnx가 있으면 _OrtNetG 생성, 아니면 None (torch net_g 사용)"""
+        onnx_path = os.path.splitext(pth_path)[0] + ".onnx"
+        if not _HAS_ORT or not self.if_f0 or not os.path.isfile(onnx_path):
+            log.warning("onnx backend requested but unavailable (onnxruntime=%s, f0=%s, %s exists=%s); using torch net_g",
+                        _HAS_ORT, self.if_f0, onnx_path, os.path.isfile(onnx_path))
+            return None
+        if self.device.type == "cuda" and "CUDAExecutionProvider" not in ort.get_available_providers():
+            log.warning("onnx backend: CUDAExecutionProvider missing; using torch net_g")
+            return None
+        self.backend = "onnx"
+        log.debug("[RVC] net_g via onnxruntime: %s", onnx_path)
+        return _OrtNetG(onnx_path, self.device, self.net_g)
+
+    def _install_torch_compile(self, dev_str: str) -> None:
+        """
+        net_g.infer와 RMVPE E2E 네트워크를 torch.compile(mode="reduce-overhead", dynamic=True)로 교체.
+        RMVPE는 파이프라인이 첫 get_f0에서 지연 생성하므로 여기서 미리 만들어 둠.
+        """
+        self.net_g.infer = torch.compile(self.net_g.infer, mode="reduce-overhead", dynamic=True)
+        if self.f0_method == "rmvpe" and not hasattr(self.pipeline, "model_rmvpe"):
+            from infer.lib.rmvpe import RMVPE
+            rmvpe_dir = os.environ["rmvpe_root"]
+            self.pipeline.model_rmvpe = RMVPE(os.path.join(rmvpe_dir, "rmvpe.pt"), is_half=self.is_half, device=dev_str)
+        rmvpe = getattr(self.pipeline, "model_rmvpe", None)
+        if rmvpe is not None and isinstance(rmvpe.model, torch.nn.Module):
+            rmvpe.model = torch.compile(rmvpe.model, mode="reduce-overhead", dynamic=True)
+        log.debug("[RVC] torch.compile(reduce-overhead) enabled for net_g%s",
+                  " + RMVPE" if rmvpe is not None else "")
+
+    def _install_rmvpe_onnx(self, dev_str: str) -> None:
+        """
+        파이프라인의 model_rmvpe를 미리 만들고 E2E 네트워크만 ONNX 세션으로 교체.
+        rmvpe.onnx가 없으면 rmvpe.pt에서 1회 export 해서 rmvpe_root에 저장.
+        """
+        if self.f0_method != "rmvpe" or self.device.type != "cuda" or not _HAS_ORT \
+                or "CUDAExecutionProvider" not in ort.get_available_providers():
+            log.warning("rmvpe_onnx requested but unavailable (f0_method=%s, device=%s, onnxruntime=%s); using torch RMVPE",
+                        self.f0_method, self.device, _HAS_ORT)
+            return
 
-    def warm_bucket(self, nb_samples: int) -> None:
+        from infer.lib.rmvpe import RMVPE
+        rmvpe_dir = os.environ["rmvpe_root"]
+        onnx_path = os.path.join(rmvpe_dir, "rmvpe.onnx")
+        rmvpe = RMVPE(os.path.join(rmvpe_dir, "rmvpe.pt"), is_half=self.is_half, device=dev_str)
+        if not os.path.isfile(onnx_path):
+            log.debug("[RVC] Exporting RMVPE to %s", onnx_path)
+            _OrtRMVPENet.export(rmvpe.model, onnx_path)
+        rmvpe.model = _OrtRMVPENet(onnx_path, torch.device(dev_str))
+        self.pipeline.model_rmvpe = rmvpe
+        log.debug("[RVC] F0 extractor: RMVPE via onnxruntime CUDA EP")
+
+    def _install_torchcrepe_f0(self) -> None:
         """
-        지정 길이(16k 기준 nb_samples) 버킷을 선워밍.
-        서버 startup에서 대표 버킷(0.5/1.0/1.5/2.0s 등)만 호출해 두는 것을 권장.
+        pipeline.get_f0를 인스턴스 단위로 교체.
+        f0_method == "torchcrepe"일 때만 torchcrepe tiny 모델(16k, hop=window)로 F0를 뽑고,
+        RVC와 동일한 규칙으로 mel 기반 1~255 coarse pitch로 양자화한다. 그 외 method는 원래 get_f0로 위임.
         """
-        if (not self.bucketing) or (nb_samples <= 0) or (nb_samples in self._warmed_buckets):
+        if not _HAS_CREPE:
+            log.warning("torchcrepe not installed, falling back to f0_method='rmvpe'")
+            self.f0_method = "rmvpe"
             return
 
-        # 환경변수 강력하게 보장 (파이프라인 내부 KeyError 방지)
-        for k, v in self._env_backup.items():
-            os.environ[k] = v
+        pipe = self.pipeline
+        orig_get_f0 = pipe.get_f0
+        device = self.device
 
-        # 추가: import 경로 확보
-        importlib.invalidate_caches()
+        def get_f0(input_audio_path, x, p_len, f0_up_key, f0_method, filter_radius, inp_f0=None):
+            if f0_method != "torchcrepe":
+                return orig_get_f0(input_audio_path, x, p_len, f0_up_key, f0_method, filter_radius, inp_f0)
 
-        print(f"[RVC] Warming bucket {nb_samples} samples")
+            audio = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32))[None].to(device)
+            f0, pd = torchcrepe.predict(
+                audio, 16000, pipe.window, pipe.f0_min, pipe.f0_max, "tiny",
+                batch_size=2048, device=device, return_periodicity=True,
+            )
+            # RVC crepe 경로와 동일: periodicity로 무성음 구간을 0으로
+            pd = torchcrepe.filter.median(pd, 3)
+            f0 = torchcrepe.filter.mean(f0, 3)
+            f0[pd < 0.1] = 0
+            f0 = f0[0].float().cpu().numpy()[:p_len]
+            if f0.shape[0] < p_len:
+                f0 = np.pad(f0, (0, p_len - f0.shape[0]), mode="constant")
+
+            f0 *= pow(2, f0_up_key / 12)
+            f0bak = f0.copy()
+            f0_mel = 1127 * np.log(1 + f0 / 700)
+            voiced = f0_mel > 0
+            f0_mel[voiced] = (f0_mel[voiced] - pipe.f0_mel_min) * 254 / (pipe.f0_mel_max - pipe.f0_mel_min) + 1
+            f0_mel[f0_mel <= 1] = 1
+            f0_mel[f0_mel > 255] = 255
+            f0_coarse = np.rint(f0_mel).astype(np.int32)
+            return f0_coarse, f0bak
+
+        pipe.get_f0 = get_f0
+        log.debug("[RVC] F0 extractor: torchcrepe tiny")
 
-        # 16kHz 기준의 무음 입력으로 파이프라인 1회 워밍
-        x = np.zeros(nb_samples, dtype=np.float32)
+    def _bucket_len(self, n: int) -> int:
+        """입력 샘플 길이 n을 버킷 경계(올림)로 정규화 (사다리 우선, 초과 시 bucket_samples 배수)"""
+        if not self.bucketing or self.bucket_samples <= 0:
+            return n
+        i = bisect_left(self.bucket_ladder, n)
+        if i < len(self.bucket_ladder):
+            return self.bucket_ladder[i]
+        bs = self.bucket_samples
+        return ((n + bs - 1) // bs) * bs
 
+    @property
+    def output_sr(self) -> int:
+        """convert() 출력 sr (resample_sr가 유효하면 그것, 아니면 모델 tgt_sr)"""
+        return self.resample_sr if (self.resample_sr and self.resample_sr >= 16000) else self.tgt_sr
+
+    def _resampled_len(self, n: int, sr: int) -> int:
+        """convert의 sr → 16k 리샘플 출력 길이를 해당 백엔드와 같은 식으로 (round로는 경계에서 1샘플 어긋남)"""
+        if sr == 16000:
+            return int(n)
+        if _HAS_TA and self.device.type == "cuda":
+            # torchaudio Resample: gcd로 줄인 비율에서 ceil(new * n / orig)
+            g = math.gcd(int(sr), 16000)
+            return int(math.ceil((16000 // g) * n / (sr // g)))
+        if _HAS_SOXR:
+            # soxr: 반올림 (x.5는 올림)
+            return (2 * n * 16000 + sr) // (2 * sr)
+        # librosa.resample(fix=True): ceil(n * ratio)
+        return int(math.ceil(n * (16000 / sr)))
+
+    def bucket_for(self, n: int, sr: int) -> int:
+        """sr 기준 입력 길이 n이 16k 리샘플 후 들어갈 버킷 길이 (convert가 실제로 쓰는 shape)"""
+        return self._bucket_len(self._resampled_len(int(n), int(sr)))
+
+    def _get_resampler(self, sr: int) -> "torchaudio.transforms.Resample":
+        """sr → 16k 리샘플러를 캐시에서 꺼냄 (없으면 생성 후 device에 올려 저장)"""
+        rs = self._resamplers.get(sr)
+        if rs is None:
+            # (BWE 튜닝: 필터폭 6, rolloff 0.85 가 빠르고 자연스러움)
+            rs = torchaudio.transforms.Resample(
+                sr, 16000, lowpass_filter_width=6, rolloff=0.85,
+                resampling_method="sinc_interp_hann",
+            ).to(self.device)
+            self._resamplers[sr] = rs
+        return rs
+
+    def _padded(self, x: np.ndarray, nb: int) -> np.ndarray:
+        """
+        x를 길이 nb로 0 패딩한 배열 반환 (_infer_lock 보유 상태에서 호출).
+        사다리 버킷은 재사용 버퍼에 앞부분만 덮어쓰고, 직전 호출이 더 길었으면 그 구간만 0으로 되돌림.
+        """
+        buf = self._pad_bufs.get(nb)
+        if buf is None:
+            if nb not in self.bucket_ladder:
+                return np.pad(x, (0, nb - x.shape[0]), mode="constant")
+            buf = (torch.zeros(nb, dtype=torch.float32, pin_memory=True).numpy()
+                   if self.device.type == "cuda" else np.zeros(nb, dtype=np.float32))
+            self._pad_bufs[nb] = buf
+            self._pad_used[nb] = 0
+        n = x.shape[0]
+        buf[:n] = x
+        used = self._pad_used[nb]
+        if used > n:
+            buf[n:used] = 0.0
+        self._pad_used[nb] = n
+        return buf
+
+    def _alloc_stage(self, n: int) -> None:
+        self._h_stage = torch.empty(n, dtype=torch.float32, pin_memory=True)
+        self._d_stage = torch.empty(n, dtype=torch.float32, device=self.device)
+
+    def _to_device(self, x: np.ndarray) -> torch.Tensor:
+        """float32 1-D 배열을 device로 복사 (pinned 스테이징 경유, 용량 초과 시 1초 단위로 키움). _stage_lock 안에서 호출"""
+        n = int(x.shape[0])
+        if self._h_stage is None:
+            return torch.from_numpy(x).to(self.device, non_blocking=True)
+        if n > self._h_stage.shape[0]:
+            sec = max(self.input_sr, 1)
+            self._alloc_stage(int(math.ceil(n / sec)) * sec)
+            log.debug("[RVC] Grew H2D staging buffer to %d samples", self._h_stage.shape[0])
+        self._h_stage[:n].copy_(torch.from_numpy(x))
+        self._d_stage[:n].copy_(self._h_stage[:n], non_blocking=True)
+        return self._d_stage[:n]
+
+    def _resolve_half(self, is_half: Union[bool, str]) -> bool:
+        """is_half="auto" 판정: Volta 이상은 FP16 텐서코어, Pascal 이하는 FP16 연산이 오히려 느려서 FP32"""
+        if is_half != "auto":
+            return bool(is_half)
+        if self.device.type != "cuda":
+            return False
+        cap = torch.cuda.get_device_capability(self.device)
+        log.info("[RVC] is_half=auto → %s (compute capability %d.%d)", cap >= (7, 0), *cap)
+        return cap >= (7, 0)
+
+    def _run_pipeline(self, x: np.ndarray, net_g) -> np.ndarray:
+        """16k float32 입력으로 RVC pipeline 1회 실행 (inference_mode + FP16 autocast)"""
         use_amp = (self.device.type == "cuda" and self.is_half)
         amp_ctx = (torch.autocast(device_type="cuda", dtype=torch.float16, enabled=use_amp)
                 if self.device.type == "cuda" else nullcontext())
 
-        # 출력 SR은 실제 추론과 동일한 규칙(아래 convert와 동일)로 맞춤
-        out_sr = self.resample_sr if (self.resample_sr and self.resample_sr >= 16000) else self.tgt_sr
-
         with torch.inference_mode():
             with amp_ctx:
-                _ = self.pipeline.pipeline(
-                    self.hubert, self.net_g, 0, x, None, [0, 0, 0],
+                return self.pipeline.pipeline(
+                    self.hubert, net_g, 0, x, None, [0, 0, 0],
                     int(self.f0_up_key), self.f0_method,
                     (self.index_path or ""), float(self.index_rate), int(self.if_f0),
                     int(self.filter_radius), int(self.tgt_sr), int(self.resample_sr),
                     float(self.rms_mix_rate), str(self.version), float(self.protect),
                     f0_file=None,
                 )
-        self._warmed_buckets.add(nb_samples)
 
-    def convert(self, pcm_float32_mono: np.ndarray, sr: int) -> tuple[np.ndarray, int]:
+    def warm_bucket(self, nb_samples: int, capture_graphs: bool = True) -> None:
+        """
+        지정 길이(16k 기준 nb_samples) 버킷을 선워밍.
+        서버 startup에서 bucket_ladder(0.5/1.0/1.5/2.0/3.0/4.0s)를 호출해 두는 것을 권장.
+        capture_graphs=False면 eager net_g로만 워밍 (CUDA Graph 캡처는 하지 않음)
+        """
+        with self._warm_lock:
+            if (not self.bucketing) or (nb_samples <= 0) or (nb_samples in self._warmed_buckets):
+                return
+            # 먼저 등록해서 동시 호출 시 같은 버킷을 두 번 워밍하지 않도록
+            self._warmed_buckets.add(nb_samples)
+
+        log.debug("[RVC] Warming bucket %d samples", nb_samples)
+
+        # 16kHz 기준의 무음 입력으로 파이프라인 워밍 (torch.compile이면 warmup_runs회)
+        x = np.zeros(nb_samples, dtype=np.float32)
+        # capture_graphs=False는 CUDA Graph 캡처만 건너뜀 (onnx 백엔드는 그대로 ORT 세션을 워밍)
+        net = self._infer_net if (capture_graphs or not self.cuda_graphs) else self.net_g
+        for _ in range(self.warmup_runs):
+            self._run_pipeline(x, net)
+
+    def warm_buckets(self, sizes: Sequence[int], max_workers: int = 2) -> None:
+        """
+        여러 버킷을 병렬 워밍 (cuDNN 탐색/CPU 디스패치/디스크 IO가 서로 겹치도록).
+        CUDA Graph 캡처는 다른 스레드의 GPU 작업과 동시에 하면 안 되므로 eager 워밍 후 순차로 진행.
+        """
+        sizes = sorted({int(nb) for nb in sizes if nb > 0})
+        if self.torch_compile:
+            max_workers = 1  # dynamo 컴파일은 스레드 간 동시 진행을 피함
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rvc-warm") as ex:
+            list(ex.map(partial(self.warm_bucket, capture_graphs=False), sizes))
+        if self.cuda_graphs:
+            for nb in sizes:
+                self._run_pipeline(np.zeros(nb, dtype=np.float32), self._infer_net)
+
+    def convert(self, pcm_float32_mono: np.ndarray, sr: int, normalize: bool = True) -> tuple[np.ndarray, int]:
         """
         입력: float32 mono PCM @ sr
         출력: (float32 mono PCM, output_sr)
         - 내부 파이프라인은 16kHz 기준
         - bucketing 활성 시: 16k 기준 버킷 길이로 패딩 → 추론 → 출력은 원래 길이에 맞춰 크롭
+        - normalize=False: 입력 DC 제거/출력 peak 0.99 정규화를 생략하고 출력은 고정 1/32768 스케일
+          (한 발화를 블록으로 나눠 변환할 때 블록마다 레벨/DC가 달라지지 않도록. 입력 DC는 호출 측에서 전체에 1회)
         """
-        # 0) 환경변수 및 import 경로 강력하게 보장
-        for k, v in self._env_backup.items():
-            os.environ[k] = v  # 매번 확실하게 설정
-
-        # import 캐시 무효화
-        importlib.invalidate_caches()
-
-        # 추가: 현재 작업 디렉토리도 RVC root로 설정 (일부 라이브러리에서 상대 경로 사용 시)
-        original_cwd = os.getcwd()
-        try:
-            os.chdir(self.rvc_root)
-
-            # 1) 가드
-            if pcm_float32_mono is None or pcm_float32_mono.size == 0:
-                return np.zeros(0, dtype=np.float32), (self.resample_sr or self.tgt_sr)
-
-            # 1) 모노/float32/연속 메모리
-            x = pcm_float32_mono if pcm_float32_mono.ndim == 1 else pcm_float32_mono.mean(axis=-1)
-            if x.dtype != np.float32:
-                x = x.astype(np.float32, copy=False)
-            x = np.ascontiguousarray(x)
-
-            # 2) 내부 SR(16k)로 1회 리샘플
-            if sr != 16000:
-                if _HAS_TA and self.device.type == "cuda":
-                    x_t = torch.from_numpy(x).to(self.device)
-                    # (BWE 튜닝: 필터폭 6, rolloff 0.85 가 빠르고 자연스러움)
-                    x_t = torchaudio.functional.resample(x_t, sr, 16000,
-                                                        lowpass_filter_width=6, rolloff=0.85)
+        # 1) 가드
+        if pcm_float32_mono is None or pcm_float32_mono.size == 0:
+            return np.zeros(0, dtype=np.float32), (self.resample_sr or self.tgt_sr)
+
+        # 1) 모노/float32/연속 메모리
+        x = pcm_float32_mono
+        if x.ndim != 1:
+            x = x.mean(axis=-1, dtype=np.float32)
+        if x.dtype != np.float32 or not x.flags["C_CONTIGUOUS"]:
+            x = np.ascontiguousarray(x, dtype=np.float32)
+        owned = x is not pcm_float32_mono  # 호출자 배열이면 전처리를 제자리에 쓰지 않음
+
+        # 2) 내부 SR(16k)로 1회 리샘플
+        if sr != 16000:
+            if _HAS_TA and self.device.type == "cuda":
+                # 스테이징 버퍼 공유 → .cpu() 동기화까지 락 유지
+                with self._stage_lock:
+                    x_t = self._get_resampler(sr)(self._to_device(x))
                     x = x_t.detach().cpu().numpy().astype(np.float32, copy=False)
-                else:
-                    # fallback
-                    x = librosa.resample(x, orig_sr=sr, target_sr=16000, res_type="kaiser_fast").astype(np.float32, copy=False)
-
-            # 3) 최소 전처리: DC 제거 + 과피크만 누름
-            if x.size:
-                x = x - float(np.mean(x))
-                peak = float(np.max(np.abs(x)))
-                if peak > 1.0:
-                    x = x / peak
-                x = np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32, copy=False)
-
-            # --- Bucketing: 패딩 길이 결정 ---
-            n_in = int(x.shape[0])
-            nb = self._bucket_len(n_in)  # bucketing=False면 n_in 그대로
-
-            # (선택) 아직 안 워밍된 버킷이면 워밍 1회
-            if self.bucketing and self.bucket_samples > 0 and nb not in self._warmed_buckets:
-                # 주의: 여기서 워밍하면 '해당 버킷의 첫 호출'이 1회 더 수행되므로
-                # 서버 startup에서 미리 warm_bucket(...)을 호출해 두는 걸 권장
-                self.warm_bucket(nb)
-
-            # 패딩 적용
+            elif _HAS_SOXR:
+                # CPU fallback: soxr(C 구현 polyphase)가 librosa/resampy보다 훨씬 빠름
+                x = soxr.resample(x, sr, 16000, quality="HQ").astype(np.float32, copy=False)
+            else:
+                # fallback (torchaudio/soxr 둘 다 없을 때만 librosa를 로드)
+                import librosa
+                x = librosa.resample(x, orig_sr=sr, target_sr=16000, res_type="kaiser_fast").astype(np.float32, copy=False)
+            owned = True
+
+        # 3) 최소 전처리: DC 제거 + 과피크만 누름 + NaN 정리 (단일 fused 패스)
+        if x.size:
+            x = _dc_peak_clean(x, x if owned else np.empty_like(x), normalize, 1.0)
+
+        # --- Bucketing: 패딩 길이 결정 ---
+        n_in = int(x.shape[0])
+        nb = self._bucket_len(n_in)  # bucketing=False면 n_in 그대로
+
+        # (선택) 아직 안 워밍된 버킷이면 워밍 1회
+        if self.bucketing and self.bucket_samples > 0 and nb not in self._warmed_buckets:
+            # 주의: 여기서 워밍하면 '해당 버킷의 첫 호출'이 1회 더 수행되므로
+            # 서버 startup에서 미리 warm_bucket(...)을 호출해 두는 걸 권장
+            self.warm_bucket(nb)
+
+        # 출력 sr 미리 계산(크롭 길이 계산에 사용)
+        out_sr = self.output_sr
+        exp_len = int(round(n_in * (out_sr / 16000.0)))  # 기대 출력 길이
+
+        # 4) 추론 (dtype 일관). 버킷 패딩 버퍼를 공유하므로 패딩~추론 구간은 직렬화
+        with self._infer_lock:
+            # 패딩 적용 (버킷별 재사용 버퍼에 복사, 꼬리는 0 유지)
             if nb != n_in:
-                x = np.pad(x, (0, nb - n_in), mode="constant")
-
-            # 출력 sr 미리 계산(크롭 길이 계산에 사용)
-            out_sr = self.resample_sr if (self.resample_sr and self.resample_sr >= 16000) else self.tgt_sr
-            exp_len = int(round(n_in * (out_sr / 16000.0)))  # 기대 출력 길이
-
-            # 4) 추론 (dtype 일관)
-            use_amp = (self.device.type == "cuda" and self.is_half)
-            amp_ctx = (torch.autocast(device_type="cuda", dtype=torch.float16, enabled=use_amp)
-                    if self.device.type == "cuda" else nullcontext())
-
-            with torch.inference_mode():
-                with amp_ctx:
-                    audio_opt = self.pipeline.pipeline(
-                        self.hubert, self.net_g, 0, x, None, [0, 0, 0],
-                        int(self.f0_up_key), self.f0_method,
-                        (self.index_path or ""), float(self.index_rate), int(self.if_f0),
-                        int(self.filter_radius), int(self.tgt_sr), int(self.resample_sr),
-                        float(self.rms_mix_rate), str(self.version), float(self.protect),
-                        f0_file=None,
-                    )
-
-            # 5) 출력 정리 + 크롭(원래 길이에 맞춤)
-            y = np.asarray(audio_opt, dtype=np.float32)
-            if y.size:
-                # 기대 길이로 크롭/패드 (드물게 샘플 1~2개 차이가 날 수 있음)
-                if y.size > exp_len:
-                    y = y[:exp_len]
-                elif y.size < exp_len:
-                    y = np.pad(y, (0, exp_len - y.size), mode="constant")
-
-                peak = float(np.max(np.abs(y)))
-                if peak > 0.99:
-                    y = (0.99 / peak) * y
-                y = np.nan_to_num(y, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32, copy=False)
-
-        finally:
-            # 작업 디렉토리 복원
-            os.chdir(original_cwd)
-
-        return y, out_sr
\ No newline at end of file
+                x = self._padded(x, nb)
+            audio_opt = self._run_pipeline(x, self._infer_net)
+
+        # 5) 출력 정리 + 크롭(원래 길이에 맞춤)
+        #    pipeline 출력(int16)을 기대 길이의 float32 배열에 바로 캐스팅 복사 → 임시배열/패딩 재할당 없음
+        src = np.asarray(audio_opt)
+        if not src.size:
+            return np.zeros(0, dtype=np.float32), out_sr
+        # 기대 길이로 크롭/패드 (드물게 샘플 1~2개 차이가 날 수 있음)
+        y = np.empty(exp_len, dtype=np.float32)
+        m = min(exp_len, src.size)
+        np.copyto(y[:m], src[:m], casting="unsafe")
+        if m < exp_len:
+            y[m:] = 0.0
+        if normalize:
+            y = _dc_peak_clean(y, y, False, 0.99)
+        else:
+            y *= np.float32(1.0 / 32768.0)  # pipeline 출력은 int16 스케일 (클립 방지 리미터는 pipeline 내부에 있음)
+
+        return y, out_sr
@@ -1,13 +1,16 @@
 # server/server.py
-import os, io
-import requests
+import asyncio
+import os, re, struct
+import httpx
 import numpy as np
-import soundfile as sf
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from .audio import wav_bytes_to_float32
 from .rvc_wrapper import RVCConverter
 
 VOICEVOX_URL = os.environ.get("VOICEVOX_URL", "http://127.0.0.1:50021")
@@ -27,16 +30,44 @@ rvc = RVCConverter(
     rms_mix_rate=0.3,
     f0_up_key=0,
     resample_sr=24000,
-    is_half=True,
-    bucketing=False,
+    is_half="auto",  # 텐서코어(CC >= 7.0) GPU에서만 FP16
+    bucketing=True,
+    bucket_ms=500,
+    cuda_graphs=True,
+    backend=os.environ.get("RVC_BACKEND", "torch"),  # "onnx": export_rvc_onnx.py로 만든 .onnx 사용
+    torch_compile=os.environ.get("RVC_COMPILE", "false").lower() == "true",
 )
 
+# RVC 전용 단일 워커: GPU 접근 직렬화 + 이벤트 루프 비블로킹 (동시 /tts 요청은 이 큐에서 순서대로)
+RVC_EXEC = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rvc")
+
+async def _rvc_convert(pcm: np.ndarray, sr: int) -> tuple[np.ndarray, int]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(RVC_EXEC, partial(rvc.convert, pcm, sr=sr))
+
 app = FastAPI()
 
+@app.on_event("startup")
+def _warm_rvc_buckets():
+    # 대표 버킷 선워밍 (길이별 첫 호출 지연 제거)
+    t = time.perf_counter()
+    rvc.warm_buckets(rvc.bucket_ladder, max_workers=2)
+    print(f"[INIT] RVC buckets warmed {rvc.bucket_ladder} in {_ms(time.perf_counter() - t)} ms")
+
 DEFAULT_SPEAKER_ID = 2  # ずんだもん ノーマル. 여성톤이면 2(四国めたん ノーマル)
+TTS_SYNTH_CONCURRENCY = 3  # 긴 텍스트 스트리밍 시 동시에 돌릴 VOICEVOX 합성 수
+
+# 문장 경계(구두점 뒤)에서 분할. "."은 뒤가 공백/끝일 때만 (3.5 같은 소수점 안에서는 자르지 않음)
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?])|(?<=\.)(?=\s|$)")
 
-session = requests.Session()
-session.headers.update({"accept": "application/json"})
+# VOICEVOX keep-alive 클라이언트 (요청마다 TCP 연결을 새로 열지 않음)
+vv_client = httpx.AsyncClient(base_url=VOICEVOX_URL, timeout=30,
+                              headers={"accept": "application/json"},
+                              limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60.0))
+
+@app.on_event("shutdown")
+async def _close_vv_client():
+    await vv_client.aclose()
 
 def _ms(sec: float) -> str:
     return str(int(round(sec * 1000)))
@@ -49,43 +80,102 @@ class TTSIn(BaseModel):
     intonation: float | None = 1.0
     rvc_enable: bool | None = True
 
-def wav_bytes_to_float32(wav_bytes: bytes) -> tuple[np.ndarray, int]:
-    buf = io.BytesIO(wav_bytes)
-    pcm, sr = sf.read(buf, dtype="float32", always_2d=False)
-    if pcm.ndim == 2:
-        pcm = pcm.mean(axis=1)
-    return pcm, sr
+# sr별 mono PCM16 WAV 헤더 템플릿 (길이 필드만 요청마다 패치)
+_WAV_HDR_TEMPLATES: dict[int, bytes] = {}
+
+def _pcm16_wav_header(sr: int, n_bytes: int | None) -> bytes:
+    """mono PCM16 WAV 44바이트 헤더 (n_bytes=None이면 길이 미정 스트리밍용 0xFFFFFFFF)"""
+    tpl = _WAV_HDR_TEMPLATES.get(sr)
+    if tpl is None:
+        tpl = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 0, b"WAVE",
+                          b"fmt ", 16, 1, 1, sr, sr * 2, 2, 16, b"data", 0)
+        _WAV_HDR_TEMPLATES[sr] = tpl
+    h = bytearray(tpl)
+    struct.pack_into("<I", h, 4, 0xFFFFFFFF if n_bytes is None else 36 + n_bytes)
+    struct.pack_into("<I", h, 40, 0xFFFFFFFF if n_bytes is None else n_bytes)
+    return bytes(h)
+
+def float32_to_pcm16_bytes(pcm: np.ndarray) -> bytes:
+    # 스케일 → 제자리 clip → int16 (float 임시배열 1개)
+    buf = np.multiply(pcm, np.float32(32767.0), dtype=np.float32)
+    np.clip(buf, -32767.0, 32767.0, out=buf)
+    return buf.astype("<i2").tobytes()
 
 def float32_to_wav_bytes(pcm: np.ndarray, sr: int) -> bytes:
-    buf = io.BytesIO()
-    sf.write(buf, pcm, sr, format="WAV", subtype="PCM_16")
-    return buf.getvalue()
+    pcm16 = float32_to_pcm16_bytes(pcm)
+    return _pcm16_wav_header(int(sr), len(pcm16)) + pcm16
 
-@app.post("/tts")
-def tts_once(body: TTSIn):
-    spk = body.speaker if body.speaker is not None else DEFAULT_SPEAKER_ID
-    t0 = time.perf_counter()
+def split_sentences(text: str) -> list[str]:
+    return [p.strip() for p in _SENTENCE_SPLIT.split(text) if p.strip()]
 
-    # audio_query
+def _vv_output_sr(rvc_enable: bool | None) -> int:
+    # RVC를 거치면 내부가 16k라 VOICEVOX에서 바로 16k로 받아 리샘플 1단계 생략
+    return 16000 if rvc_enable else int(getattr(rvc, "tgt_sr", 24000))
+
+async def _voicevox_synth(text: str, spk: int, speed: float | None, out_sr: int) -> tuple[bytes, float, float]:
+    """audio_query → synthesis (outputSamplingRate=out_sr). (wav_bytes, query 시간, synth 시간)"""
     t = time.perf_counter()
-    q = requests.post(f"{VOICEVOX_URL}/audio_query",
-                      params={"text": body.text, "speaker": spk}, timeout=10).json()
-    q["outputSamplingRate"] = int(getattr(rvc, "tgt_sr", 24000))
+    q = (await vv_client.post("/audio_query",
+                              params={"text": text, "speaker": spk}, timeout=10)).json()
+    q["outputSamplingRate"] = int(out_sr)
     q["outputStereo"] = False
-    q["speedScale"] = float(body.speed or 1.0)
-    t_audio_query = time.perf_counter() - t
+    q["speedScale"] = float(speed or 1.0)
+    t_query = time.perf_counter() - t
 
-    # synthesis
     t = time.perf_counter()
-    wav_bytes = requests.post(f"{VOICEVOX_URL}/synthesis",
-                              params={"speaker": spk}, json=q, timeout=30).content
-    t_synth = time.perf_counter() - t
+    wav_bytes = (await vv_client.post("/synthesis",
+                                      params={"speaker": spk}, json=q)).content
+    return wav_bytes, t_query, time.perf_counter() - t
+
+async def _stream_sentences(sentences: list[str], spk: int, body: TTSIn, out_sr: int):
+    """
+    문장별 VOICEVOX 합성을 최대 TTS_SYNTH_CONCURRENCY개 동시에 돌리고,
+    끝난 순서가 아니라 문장 순서대로 RVC 변환 → PCM16 전송.
+    WAV 헤더는 맨 앞에 1번만 (길이 미정), 이후는 raw PCM.
+    """
+    t0 = time.perf_counter()
+    sem = asyncio.Semaphore(TTS_SYNTH_CONCURRENCY)
+
+    async def synth_one(text: str) -> bytes:
+        async with sem:
+            wav_bytes, _, _ = await _voicevox_synth(text, spk, body.speed, _vv_output_sr(body.rvc_enable))
+            return wav_bytes
+
+    tasks = [asyncio.create_task(synth_one(text)) for text in sentences]
+    try:
+        yield _pcm16_wav_header(out_sr, None)
+        for i, task in enumerate(tasks):
+            pcm, sr = wav_bytes_to_float32(await task)
+            if body.rvc_enable:
+                pcm, sr = await _rvc_convert(pcm, sr=sr)
+            if i == 0:
+                print(f"[TIME] first segment ready in {_ms(time.perf_counter() - t0)} ms")
+            yield float32_to_pcm16_bytes(pcm)
+        print(f"[TIME] streamed {len(sentences)} segments | total={_ms(time.perf_counter() - t0)} ms")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@app.post("/tts")
+async def tts_once(body: TTSIn):
+    spk = body.speaker if body.speaker is not None else DEFAULT_SPEAKER_ID
+
+    # 여러 문장이면 문장 단위로 합성/변환하며 바로 스트리밍 (첫 오디오까지 한 문장 분량 지연)
+    sentences = split_sentences(body.text)
+    if len(sentences) > 1:
+        out_sr = rvc.output_sr if body.rvc_enable else _vv_output_sr(False)
+        return StreamingResponse(_stream_sentences(sentences, spk, body, out_sr), media_type="audio/wav")
+
+    t0 = time.perf_counter()
+
+    # audio_query + synthesis
+    wav_bytes, t_audio_query, t_synth = await _voicevox_synth(body.text, spk, body.speed, _vv_output_sr(body.rvc_enable))
 
     # RVC convert (옵션)
     t = time.perf_counter()
     if body.rvc_enable:
         pcm, sr = wav_bytes_to_float32(wav_bytes)
-        conv_pcm, out_sr = rvc.convert(pcm, sr=sr)
+        conv_pcm, out_sr = await _rvc_convert(pcm, sr=sr)
         wav_bytes = float32_to_wav_bytes(conv_pcm, sr=out_sr)
     t_rvc = time.perf_counter() - t
 
@@ -1,25 +1,51 @@
 # server/ws_app.py
-import asyncio, json, io, os, re
+import asyncio, hashlib, io, logging, os, struct
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
-from typing import List, AsyncGenerator
+from functools import partial
+from typing import List, AsyncGenerator, Optional, Tuple
 import anyio
 import datetime
 import time
 
+import httpx
 import numpy as np
-import requests
+import orjson
 import soundfile as sf
 from fastapi import FastAPI, WebSocket
 from starlette.websockets import WebSocketDisconnect
 
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except Exception:
+    _HAS_NUMBA = False
+
+try:
+    import numexpr as ne
+    _HAS_NUMEXPR = True
+except Exception:
+    _HAS_NUMEXPR = False
+
 # --- 기존 코드 재사용 ---
-from .server import wav_bytes_to_float32  # (네 server.py에 있는 함수)
+from .audio import (OUT_SR, SILENCE_20MS, GAP_50MS, _INV32768, _frame_samples,
+                    _silence, _silence_cuts, iter_pcm16_frames, pcm16, split_frames, wav_bytes_to_float32)
 from .rvc_wrapper import RVCConverter
+from .rvc_proc import RVCProcess
+from .pipeline import _PUNCT_END_RE, _is_synth_worthy, merge_short_pieces, pipeline_pieces, slice_text
+
+log = logging.getLogger("ws")
 
 # ====== 설정 ======
 VOICEVOX_URL = os.environ.get("VOICEVOX_URL", "http://127.0.0.1:50021")
 DEFAULT_SPEAKER_ID = int(os.environ.get("VV_SPK", "2"))  # ずんだもん ノーマル
-DEBUG_SAVE_AUDIO = os.environ.get("DEBUG_SAVE_AUDIO", "true").lower() == "true"
+DEBUG_SAVE_AUDIO = os.environ.get("DEBUG_SAVE_AUDIO", "false").lower() == "true"
+# 피스마다 librosa.pyin 피치 범위 로그 (무거움: 피스당 50~200ms CPU)
+ENABLE_PITCH_DEBUG = os.environ.get("PITCH_DEBUG", "false").lower() == "true"
+
+# RVC 실행 위치: "thread"(기본, 전용 스레드) / "process"(spawn 워커 프로세스, 모델도 그쪽에 로드)
+RVC_WORKER = os.environ.get("RVC_WORKER", "thread").lower()
 
 # 디버그 로그 활성화 여부
 enableDebugLog = True
@@ -29,7 +55,7 @@ ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 print("[INIT] Initializing RVC...")
 try:
-    rvc = RVCConverter(
+    rvc = (RVCProcess if RVC_WORKER == "process" else RVCConverter)(
         rvc_root=os.path.join(ROOT, "third_party", "RVC"),
         pth_path=os.path.join(ROOT, "models", "rvc", "Fern_e300_s1800.pth"),
         index_path=os.path.join(ROOT, "models", "rvc", "added_IVF75_Flat_nprobe_1_Fern_v2.index"),
@@ -41,94 +67,559 @@ try:
         filter_radius=5,        # 피치 평활화
         rms_mix_rate=0,      # 25% 원본 볼륨 믹싱 (자연스러움 향상)
         f0_up_key=0,           # OpenAI(156Hz) → VOICEVOX(365Hz) 맞춤: +15 반음 ≈ 365Hz
-        resample_sr=24000,      # 전송용 24k로 통일
-        is_half=True,           # FP16으로 메모리/속도 최적화
+        resample_sr=OUT_SR,     # 전송용 24k로 통일
+        is_half="auto",         # FP16으로 메모리/속도 최적화 (텐서코어 있는 GPU에서만)
         bucketing=False,        # 비활성화 (품질 우선)
         bucket_ms=500,          # 0.5초 버킷
+        stage_sec=10,           # 버킷 없음 → 발화 전체 길이 기준 pinned 스테이징 (ws_rvc는 발화 단위 변환)
+        backend=os.environ.get("RVC_BACKEND", "torch"),  # "onnx": export_rvc_onnx.py로 만든 .onnx 사용
+        torch_compile=os.environ.get("RVC_COMPILE", "false").lower() == "true",  # 첫 컴파일이 느림
     )
-    print(f"[INIT] RVC initialized successfully. Environment 'infer': {os.environ.get('infer', 'NOT_SET')}")
+    print(f"[INIT] RVC initialized successfully ({RVC_WORKER}). Environment 'infer': {os.environ.get('infer', 'NOT_SET')}")
     print(f"[INIT] RVC target SR: {getattr(rvc, 'tgt_sr', 'UNKNOWN')}")
 
-    # 워밍업: 더미 오디오로 첫 변환 실행 (Cold Start 제거)
+except Exception as e:
+    print(f"[ERROR] RVC initialization failed: {e}")
+    rvc = None
+
+def _warmup_rvc():
+    """워밍업: 더미 오디오로 첫 변환 실행 (Cold Start 제거)"""
     print("[INIT] Warming up RVC with dummy audio...")
     warmup_start = time.perf_counter()
     dummy_audio = np.random.randn(24000).astype(np.float32) * 0.01  # 1초, 작은 볼륨
     try:
-        rvc.convert(dummy_audio, sr=24000)
+        # torch.compile이면 컴파일 캐시/그래프가 잡히도록 여러 번
+        for _ in range(getattr(rvc, "warmup_runs", 1)):
+            rvc.convert(dummy_audio, sr=24000)
         warmup_time = time.perf_counter() - warmup_start
         print(f"[INIT] RVC warmup completed in {warmup_time*1000:.1f}ms")
     except Exception as e:
         print(f"[WARN] RVC warmup failed: {e}")
 
-except Exception as e:
-    print(f"[ERROR] RVC initialization failed: {e}")
-    rvc = None
-
 app = FastAPI()
-session = requests.Session()
-session.post(f"{VOICEVOX_URL}/initialize_speaker",
-             params={"speaker": DEFAULT_SPEAKER_ID, "skip_reinit": True}, timeout=10)
-
-def slice_text(s: str) -> List[str]:
-    """구두점 기준으로 자연스럽게 쪼개기 (VOICEVOX 품질 보장)"""
-    # 구두점으로 분할하되 구두점을 앞 문장에 포함시킴
-    parts = re.split(r'([。！？!?、,])', s)
-    merged, buf = [], ""
-
-    for i, part in enumerate(parts):
-        buf += part
-
-        # 구두점일 때만 분할 (자연스러운 문장 단위)
-        if part in "。！？!?、,":
-            if buf.strip():  # 빈 문자열이 아닐 때만 추가
-                merged.append(buf.strip())
-            buf = ""
-
-    # 마지막 남은 부분
-    if buf.strip():
-        merged.append(buf.strip())
-
-    # 구두점만 있는 피스들 제거
-    result = []
-    for piece in merged:
-        # 구두점과 공백만 있는 피스는 제외
-        if re.sub(r'[。！？!?、,\s]', '', piece):
-            result.append(piece)
-
-    return result
-
-def iter_pcm16_frames(pcm_f32: np.ndarray, sr: int, frame_ms: int = 20):
-    """float32 → PCM16 20ms 프레임 바이너리 생성기"""
-    n = int(sr * frame_ms / 1000)
-    for i in range(0, len(pcm_f32), n):
-        f = pcm_f32[i:i+n]
-        if f.size < n:
-            f = np.pad(f, (0, n - f.size), constant_values=0)
-        f = np.clip(f, -1.0, 1.0)
-        yield (f * 32767.0).astype(np.int16).tobytes()
+
+# RVC 전용 단일 워커: GPU 접근 직렬화 + 이벤트 루프 비블로킹 (CUDA 커널 중 GIL 해제)
+RVC_EXEC = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rvc")
+
+async def _rvc_convert(pcm: np.ndarray, sr: int, normalize: bool = True):
+    """rvc.convert를 전용 스레드(또는 워커 프로세스)에서 실행 → (conv, out_sr)"""
+    if isinstance(rvc, RVCProcess):
+        return await asyncio.wrap_future(rvc.submit(pcm, sr, normalize))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(RVC_EXEC, partial(rvc.convert, pcm, sr=sr, normalize=normalize))
+
+async def rvc_stream(pcm: np.ndarray, sr: int) -> AsyncGenerator[Tuple[np.ndarray, int, bool], None]:
+    """
+    발화를 무음 지점에서 블록으로 잘라 순서대로 변환, 블록마다 (conv, out_sr, 마지막 블록 여부) yield.
+    블록 k를 내보내는 동안 블록 k+1 변환이 이미 RVC 워커에서 돌고 있음.
+    - 블록 1개(짧은 발화): 기존과 같이 convert가 peak 0.99로 정규화
+    - 여러 블록: 블록별 정규화를 끄고(normalize=False) 첫 블록의 peak로 정한 게인 하나를 나머지에도 적용
+      (블록마다 게인이 달라져 경계에서 레벨이 튀지 않도록. 첫 블록보다 큰 피크는 PCM16 변환 때 클립)
+    """
+    bounds = [0] + _silence_cuts(pcm, sr) + [len(pcm)]
+    spans = list(zip(bounds[:-1], bounds[1:]))
+    normalize = len(spans) == 1
+    gain = None
+    nxt = asyncio.ensure_future(_rvc_convert(pcm[spans[0][0]:spans[0][1]], sr, normalize=normalize))
+    try:
+        for j in range(len(spans)):
+            conv, out_sr = await nxt
+            last = j + 1 == len(spans)
+            if not last:
+                a, b = spans[j + 1]
+                nxt = asyncio.ensure_future(_rvc_convert(pcm[a:b], sr, normalize=False))
+            if not normalize and conv.size:
+                if gain is None:
+                    peak = float(np.max(np.abs(conv)))
+                    gain = np.float32(0.99 / peak) if peak > 0 else None
+                if gain is not None:
+                    conv *= gain
+            yield conv, out_sr, last
+    finally:
+        nxt.cancel()
+
+# VOICEVOX 비동기 keep-alive 클라이언트 (이벤트 루프를 막지 않음)
+# 발화 사이 공백(수 초~수십 초) 동안에도 연결을 유지하도록 keepalive_expiry를 기본 5초보다 길게
+VV_LIMITS = httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60.0)
+VV = httpx.AsyncClient(base_url=VOICEVOX_URL, timeout=30, limits=VV_LIMITS)
+
+@app.on_event("startup")
+async def _init_vv():
+    # 실패해도 기동은 계속 (첫 합성이 초기화 비용을 치름) → 원인은 남김
+    try:
+        r = await VV.post("/initialize_speaker",
+                          params={"speaker": DEFAULT_SPEAKER_ID, "skip_reinit": True}, timeout=10)
+        r.raise_for_status()
+    except httpx.HTTPError as e:
+        log.warning("[INIT] VOICEVOX initialize_speaker failed (speaker=%d): %r", DEFAULT_SPEAKER_ID, e)
+
+@app.on_event("startup")
+async def _warmup_pcm16_kernel():
+    await asyncio.to_thread(_warmup_pcm16)
+
+@app.on_event("startup")
+async def _start_rvc_warmup():
+    # import/부팅을 막지 않도록 RVC 전용 워커에 던져둠 (초기 요청은 워밍업 뒤에 줄을 섬)
+    if rvc is not None:
+        RVC_EXEC.submit(_warmup_rvc)
+
+@app.on_event("shutdown")
+async def _close_vv():
+    await VV.aclose()
+
+@app.on_event("shutdown")
+async def _shutdown_rvc_exec():
+    RVC_EXEC.shutdown(wait=False)
+    DEBUG_IO_EXEC.shutdown(wait=False)  # 남은 디버그 쓰기는 인터프리터 종료 시 join
+    if isinstance(rvc, RVCProcess):
+        rvc.shutdown()
+
+async def vv_synthesize(text: str, speaker: int, out_sr: int) -> bytes:
+    """VOICEVOX audio_query → synthesis, WAV 바이트 반환 (query JSON은 orjson으로 직렬화)"""
+    r = await VV.post("/audio_query", params={"text": text, "speaker": speaker}, timeout=10)
+    r.raise_for_status()
+    q = orjson.loads(r.content)
+    q["outputSamplingRate"] = int(out_sr)
+    q["outputStereo"] = False
+    r = await VV.post("/synthesis", params={"speaker": speaker}, content=orjson.dumps(q),
+                      headers={"Content-Type": "application/json"})
+    r.raise_for_status()
+    return r.content
+
+# 한 번의 send_bytes로 묶어 보낼 20ms 프레임 수 (5 = 100ms, 실시간감 유지 한도)
+SEND_BATCH_FRAMES = 5
+# 연속 send_bytes 루프에서 이 횟수마다 sleep(0)으로 양보 (send가 버퍼에만 쌓이면 루프를 안 놓음 → ping/다른 연결 지연)
+SEND_YIELD_EVERY = 10
+
+def _warmup_pcm16():
+    """numba 커널 컴파일(또는 캐시 로드)을 첫 요청 전에 끝내둠"""
+    pcm16(np.zeros(480, dtype=np.float32), gate=NOISE_THR)
+
+def _normalize_inplace(x: np.ndarray, target: float = 0.95, min_peak: Optional[float] = None) -> np.ndarray:
+    """
+    RVC 입력 전처리 (in-place, 임시배열은 |x| 1개):
+    DC 제거 후 min_peak가 None이면 peak > target일 때만 target으로 축소,
+    min_peak가 주어지면 peak > min_peak일 때 peak를 target으로 맞춤 (증폭 포함)
+    """
+    if x.size == 0:
+        return x
+    x -= x.mean()
+    peak = float(np.abs(x).max())
+    if min_peak is None:
+        if peak > target:
+            x *= target / peak
+    elif peak > min_peak:
+        x *= target / peak
+    return x
+
+# RVC 출력 후처리 파라미터
+FADE_MAX = 240       # 5ms @ 48kHz
+NOISE_THR = 0.001    # 이 미만 절대값은 0으로
+# 노이즈 게이트 on/off (RVC_NOISE_GATE=0이면 페이드만: 양끝 FADE_MAX 샘플만 건드리고 버퍼 전체 패스 생략)
+NOISE_GATE = os.environ.get("RVC_NOISE_GATE", "1") == "1"
+
+# 페이드 램프 캐시: (길이, dtype) → (fade_in, fade_out). fade_len은 거의 항상 FADE_MAX
+_FADE_CACHE = {}
+
+def _fades(n: int, dtype=np.float32):
+    key = (n, np.dtype(dtype))
+    f = _FADE_CACHE.get(key)
+    if f is None:
+        fi = np.linspace(0, 1, n, dtype=dtype)
+        f = (fi, np.linspace(1, 0, n, dtype=dtype))
+        _FADE_CACHE[key] = f
+    return f
+
+def _postprocess_np(conv: np.ndarray, fade_in_len: int, fade_out_len: int, noise_thr: float) -> np.ndarray:
+    if fade_in_len > 0:
+        conv[:fade_in_len] *= _fades(fade_in_len, conv.dtype)[0]
+    if fade_out_len > 0:
+        conv[-fade_out_len:] *= _fades(fade_out_len, conv.dtype)[1]
+    if noise_thr <= 0:
+        return conv
+    # 노이즈 게이트: numexpr면 abs+비교+선택을 블록 단위 1패스, 아니면 putmask (팬시 인덱싱 임시배열 제거)
+    if _HAS_NUMEXPR:
+        thr = conv.dtype.type(noise_thr)
+        ne.evaluate("where(abs(conv) < thr, 0, conv)", out=conv, casting="same_kind")
+    else:
+        np.putmask(conv, np.abs(conv) < noise_thr, 0)
+    return conv
+
+if _HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _postprocess(conv, fade_in_len, fade_out_len, noise_thr):
+        """_postprocess_np와 동일(linspace 램프)한 결과를 버퍼 1회 순회, 임시배열 없이"""
+        n = conv.shape[0]
+        inv_in = 1.0 / (fade_in_len - 1) if fade_in_len > 1 else 0.0
+        inv_out = 1.0 / (fade_out_len - 1) if fade_out_len > 1 else 0.0
+        tail = n - fade_out_len
+        if noise_thr <= 0:
+            # 게이트 없음: 양끝 페이드 구간만 (페이드 길이 <= n // 20 이라 두 구간은 겹치지 않음)
+            for i in range(fade_in_len):
+                conv[i] *= i * inv_in
+            if fade_out_len > 1:
+                for i in range(tail, n):
+                    conv[i] *= (n - 1 - i) * inv_out
+            return conv
+        for i in range(n):
+            v = conv[i]
+            if i < fade_in_len:
+                v *= i * inv_in
+            if i >= tail and fade_out_len > 1:
+                v *= (n - 1 - i) * inv_out
+            if -noise_thr < v < noise_thr:
+                v = 0.0
+            conv[i] = v
+        return conv
+else:
+    _postprocess = _postprocess_np
+
+def postprocess_audio(conv: np.ndarray, fade_in: bool = True, fade_out: bool = True) -> np.ndarray:
+    """
+    RVC 출력 in-place 후처리: 양끝 페이드(클릭 방지) + 미소값 0 (노이즈 제거, NOISE_GATE일 때만).
+    발화를 블록으로 나눠 보낼 때는 첫 블록 머리(fade_in)/마지막 블록 꼬리(fade_out)만 페이드
+    """
+    if conv.size == 0:
+        return conv
+    fade_len = min(FADE_MAX, conv.size // 20)
+    return _postprocess(conv, fade_len if fade_in else 0, fade_len if fade_out else 0,
+                        NOISE_THR if NOISE_GATE else 0.0)
+
+# VOICEVOX 결과 캐시: (speaker, sr, blake2b(text)) → 전처리 끝난 float32 PCM
+# 인사/맞장구 같은 짧은 피스가 반복되면 HTTP 2회 + 디코드/정규화를 통째로 건너뜀
+VV_CACHE_SIZE = 512
+_vv_cache: "OrderedDict[tuple, Tuple[np.ndarray, int]]" = OrderedDict()
+
+def _vv_cache_key(text: str, speaker: int, sr: int) -> tuple:
+    return (int(speaker), int(sr), hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+
+async def synth_pcm(text: str, speaker: int, tgt_sr: int) -> Tuple[np.ndarray, int]:
+    """
+    piece → (DC 제거/피크 제한까지 끝난 float32 PCM, sr), LRU 캐시 경유.
+    반환 배열은 캐시와 공유되므로 호출 측에서 수정하지 말 것 (rvc.convert는 입력을 건드리지 않음)
+    """
+    key = _vv_cache_key(text, speaker, tgt_sr)
+    hit = _vv_cache.get(key)
+    if hit is not None:
+        _vv_cache.move_to_end(key)
+        return hit
+
+    wav_bytes = await vv_synthesize(text, speaker, tgt_sr)
+    pcm, sr = wav_bytes_to_float32(wav_bytes)
+    if pcm is None or pcm.size == 0:
+        return np.zeros(0, dtype=np.float32), sr
+    _normalize_inplace(pcm)
+
+    _vv_cache[key] = (pcm, sr)
+    if len(_vv_cache) > VV_CACHE_SIZE:
+        _vv_cache.popitem(last=False)
+    return pcm, sr
+
+# 디버그 WAV 저장: 전용 I/O 스레드 2개 (기본 to_thread 풀/RVC 워커와 분리, 큐잉은 executor가 담당)
+DEBUG_IO_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix="debug-io")
+
+def _dump_write(path: str, pcm: np.ndarray, sr: int):
+    try:
+        sf.write(path, pcm, sr, format="WAV", subtype="PCM_16")
+    except Exception as e:
+        print(f"[DEBUG] Failed to save {path}: {e}")
+
+def _dump(path: str, pcm: np.ndarray, sr: int):
+    """
+    디버그 WAV를 fire-and-forget으로 저장.
+    float32는 이후 원본이 in-place 수정돼도 되도록 복사본, int16(송출용 최종 버퍼)은 수정되지 않으므로 그대로
+    (int16은 libsndfile의 float 스케일 경로도 건너뜀)
+    """
+    data = pcm if pcm.dtype == np.int16 else np.array(pcm, dtype=np.float32)
+    DEBUG_IO_EXEC.submit(_dump_write, path, data, int(sr))
+
+def _compute_f0_range(pcm: np.ndarray, sr: int) -> str:
+    """디버그용 입력 피치 범위 문자열 (librosa.pyin, librosa는 필요할 때만 import)"""
+    f0_range = "unknown"
+    try:
+        import librosa
+        f0, voiced_flag, voiced_probs = librosa.pyin(pcm, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'), sr=sr)
+        f0_valid = f0[~np.isnan(f0)]
+        if len(f0_valid) > 0:
+            f0_mean = np.mean(f0_valid)
+            f0_range = f"{np.min(f0_valid):.1f}-{np.max(f0_valid):.1f}Hz (mean: {f0_mean:.1f}Hz)"
+    except:
+        pass
+    return f0_range
+
+async def synth_and_stream(ch: "_Channel", pieces: List[str], spk: int, tgt_sr: int, *,
+                           tag: str, label: str = "Piece", debug_dir: Optional[str] = None,
+                           gap_ms: int = 0,
+                           skip_errors: bool = True) -> None:
+    """
+    피스 목록 → (짧은 피스 병합) → VOICEVOX(캐시) → RVC → 후처리 → 피스당 1메시지 송출 (pipeline_pieces 경유).
+    - gap_ms      : > 0이면 피스 사이 무음 삽입 + 출력이 비어도 20ms 무음을 보냄
+    - skip_errors : True면 실패한 피스만 건너뛰고, False면 예외를 호출 측으로 올림
+    """
+    pieces = merge_short_pieces(pieces)
+    n = len(pieces)
+
+    async def synth(i, piece):
+        if enableDebugLog:
+            print(f"[{tag}] Processing {label.lower()} {i+1}/{n}: '{piece}'")
+
+        # 구두점만 있거나 너무 짧은 피스는 HTTP 호출 전에 건너뛰기 (노이즈 방지)
+        if not _is_synth_worthy(piece):
+            print(f"[{tag}] Skipping too short piece: '{piece}'")
+            return None
+
+        # VOICEVOX 합성 + RVC 입력 전 정리 (DC offset 제거 + 볼륨 정규화, 캐시 경유)
+        piece_start = time.perf_counter()
+        try:
+            pcm, sr = await synth_pcm(piece, spk, tgt_sr)
+        except Exception as e:
+            if not skip_errors:
+                raise
+            print(f"[{tag}] {label} TTS error: {e}")
+            return None
+        if pcm.size == 0:
+            return None
+        return pcm, sr, piece_start, time.perf_counter() - piece_start
+
+    async def convert(i, item):
+        pcm, sr, piece_start, voicevox_time = item
+        try:
+            # 디버그: RVC 입력 전처리 결과 저장
+            if debug_dir:
+                _dump(os.path.join(debug_dir, f"piece_{i+1:02d}_pre_rvc.wav"), pcm, sr)
+
+            # 피치 분석 (VOICEVOX 입력, PITCH_DEBUG=true일 때만 / 루프 밖 스레드에서)
+            if ENABLE_PITCH_DEBUG:
+                f0_range = await asyncio.to_thread(_compute_f0_range, pcm, sr)
+                print(f"[{tag}] VOICEVOX input pitch range: {f0_range}")
+
+            # RVC 변환 (전용 스레드, 그동안 다음 피스의 VOICEVOX 합성이 진행됨)
+            rvc_start = time.perf_counter()
+            conv, out_sr = await _rvc_convert(pcm, sr)
+
+            # 디버그: RVC 원본 결과 저장
+            if debug_dir:
+                _dump(os.path.join(debug_dir, f"piece_{i+1:02d}_rvc_raw.wav"), conv, out_sr)
+
+            # RVC 출력 후 정리 (시작/끝 페이드 + 노이즈 제거)
+            postprocess_audio(conv)
+            rvc_time = time.perf_counter() - rvc_start
+
+            # 디버그: 최종 결과 저장 (PCM16 변환 1회 → 같은 버퍼를 WAV 저장과 송출에 공유)
+            if debug_dir:
+                conv = pcm16(conv)
+                _dump(os.path.join(debug_dir, f"piece_{i+1:02d}_final.wav"), conv, out_sr)
+                print(f"[DEBUG] Queued debug files for piece {i+1}")
+        except Exception as e:
+            if not skip_errors:
+                raise
+            print(f"[{tag}] {label} TTS error: {e}")
+            return None
+        if conv.size == 0 and not gap_ms:
+            return None
+        return conv, out_sr, piece_start, voicevox_time, rvc_time
+
+    async def emit(i, item):
+        conv, out_sr, piece_start, voicevox_time, rvc_time = item
+
+        # 오디오 스트리밍: 피스 전체(+ 무음/간격)를 버퍼 하나로 모아 send_bytes 1회
+        streaming_start = time.perf_counter()
+        # 꼬리(출력이 비었을 때 20ms 무음 + 피스 사이 간격)는 PCM 바로 뒤에 같은 버퍼로
+        tail = b""
+        if gap_ms:
+            if conv.size == 0:
+                tail = SILENCE_20MS if out_sr == OUT_SR else _silence(out_sr, 20)
+            # 피스 사이에 짧은 침묵 추가 (노이즈 분리)
+            if i < n - 1:
+                tail += GAP_50MS if (out_sr, gap_ms) == (OUT_SR, 50) else _silence(out_sr, gap_ms)
+        nbytes = await ch.pcm_piece(conv, tail)
+        streaming_time = time.perf_counter() - streaming_start
+
+        piece_total = time.perf_counter() - piece_start
+        print(f"[{tag}] {label} {i+1}/{n} completed - VOICEVOX: {voicevox_time*1000:.1f}ms, RVC: {rvc_time*1000:.1f}ms, Streaming: {streaming_time*1000:.1f}ms, Total: {piece_total*1000:.1f}ms ({nbytes} bytes)")
+
+    await pipeline_pieces(pieces, synth, convert, emit)
+
+# 고정 제어 이벤트는 모듈 로드 시 1회 인코딩 (클라는 '"event":"end"' 부분 문자열로 판정 → 공백 없는 orjson 출력 유지)
+_END = orjson.dumps({"event": "end"}).decode()
+_READY = orjson.dumps({"event": "ready"}).decode()
+_RVC_NOT_READY = orjson.dumps({"event": "error", "detail": "RVC not initialized"}).decode()
+_ERR_PREFIX = '{"event":"error","detail":'
+
+def _error_event(detail) -> str:
+    """에러 이벤트 JSON (가변 부분인 detail만 인코딩)"""
+    return _ERR_PREFIX + orjson.dumps(str(detail)).decode() + "}"
+
+# 바이너리 프로토콜 (?proto=bin으로 접속한 클라만): 모든 메시지를 [u8 kind][u32 len BE][payload] 바이너리 1개로
+# PCM은 payload가 PCM16 LE, 제어 이벤트는 위와 같은 JSON(UTF-8). END는 payload 없음
+# 기존 클라(Unity)는 바이너리를 전부 PCM으로 읽으므로 기본값은 기존 텍스트 JSON + raw PCM 그대로
+EVT_PCM, EVT_END, EVT_READY, EVT_ERROR = 0, 1, 2, 3
+_PACK_HDR = struct.Struct("!BI")
+
+def pack(kind: int, payload: bytes = b"") -> bytes:
+    return _PACK_HDR.pack(kind, len(payload)) + payload
+
+_END_BIN = pack(EVT_END)
+
+# 피스 송신 버퍼: 페이로드는 8바이트 정렬 위치부터 (int16 뷰 정렬), 바이너리 헤더(5B)는 바로 앞 [3:8]에
+_PAYLOAD_OFS = 8
+_SEND_BUF_STEP = 64 * 1024
+
+class _Channel:
+    """연결별 송신 경로 (텍스트 JSON + raw PCM / 길이 프리픽스 바이너리) + 재사용 송신 버퍼"""
+    __slots__ = ("ws", "binary", "_buf")
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.binary = ws.query_params.get("proto") == "bin"
+        self._buf = bytearray()
+
+    async def pcm_piece(self, conv: np.ndarray, tail: bytes = b"") -> int:
+        """
+        float32(또는 int16) PCM + 꼬리 무음을 연결별 버퍼에 바로 써서 메시지 1개로 송신, 페이로드 바이트 수 반환.
+        변환 커널이 버퍼에 직접 쓰므로 피스당 bytes 생성은 send용 1회뿐 (버퍼는 64KiB 단위로 늘어나기만 함)
+        """
+        n = conv.size * 2
+        total = n + len(tail)
+        if total == 0:
+            return 0
+        end = _PAYLOAD_OFS + total
+        if len(self._buf) < end:
+            # 크기 변경 대신 새로 할당 (이전 버퍼를 가리키는 numpy 뷰가 있어도 안전)
+            self._buf = bytearray(-(-end // _SEND_BUF_STEP) * _SEND_BUF_STEP)
+        if n:
+            dst = np.frombuffer(self._buf, dtype=np.int16, count=conv.size, offset=_PAYLOAD_OFS)
+            if conv.dtype == np.int16:
+                dst[:] = conv
+            else:
+                pcm16(conv, out=dst)
+        mv = memoryview(self._buf)
+        mv[_PAYLOAD_OFS + n:end] = tail
+        start = _PAYLOAD_OFS
+        if self.binary:
+            start -= _PACK_HDR.size
+            _PACK_HDR.pack_into(self._buf, start, EVT_PCM, total)
+        await self.ws.send_bytes(bytes(mv[start:end]))
+        return total
+
+    async def pcm(self, data: bytes):
+        await self.ws.send_bytes(pack(EVT_PCM, data) if self.binary else data)
+
+    async def event(self, kind: int, text: str):
+        if self.binary:
+            await self.ws.send_bytes(pack(kind, text.encode()))
+        else:
+            await self.ws.send_text(text)
+
+    async def end(self):
+        if self.binary:
+            await self.ws.send_bytes(_END_BIN)
+        else:
+            await self.ws.send_text(_END)
+
+    async def ready(self, text: str = _READY):
+        await self.event(EVT_READY, text)
+
+    async def error(self, detail):
+        await self.event(EVT_ERROR, _error_event(detail))
 
 @app.get("/health")
 def health():
-    return {"ok": True, "tgt_sr": getattr(rvc, "tgt_sr", 24000)}
+    return {"ok": True, "tgt_sr": getattr(rvc, "tgt_sr", OUT_SR)}
+
+class _TTSStreamState:
+    """ws_tts_stream 연결별 상태 (텍스트 버퍼 / 화자 / 출력 sr)"""
+    __slots__ = ("text_buffer", "speaker", "tgt_sr")
+
+    def __init__(self, tgt_sr: int):
+        self.text_buffer = ""
+        self.speaker = DEFAULT_SPEAKER_ID
+        self.tgt_sr = tgt_sr
+
+async def _on_text(ch: _Channel, data: dict, state: _TTSStreamState):
+    # 텍스트 청크 수신
+    text_chunk = data.get("text", "")
+    state.text_buffer += text_chunk
+    text_buffer = state.text_buffer
+
+    if enableDebugLog:
+        print(f"[TTS_STREAM] Received text chunk: '{text_chunk}' (buffer: '{text_buffer}')")
+
+    # slice_text로 즉시 처리 가능한 조각 추출
+    pieces = slice_text(text_buffer)
+    if not pieces:
+        return
+
+    # 마지막 조각은 미완성일 수 있으므로 확인
+    # 버퍼가 구두점으로 끝나면 모든 조각 처리, 아니면 마지막 조각 보류
+    processable_pieces = pieces
+    if not _PUNCT_END_RE.search(text_buffer):
+        # 버퍼가 구두점으로 끝나지 않으면 마지막 조각은 미완성
+        if len(pieces) > 1:
+            processable_pieces = pieces[:-1]
+            # 마지막 조각을 버퍼에 남김
+            state.text_buffer = pieces[-1]
+        else:
+            # 조각이 1개뿐이면 아직 처리 불가
+            processable_pieces = []
+    else:
+        # 구두점으로 끝나면 모두 처리하고 버퍼 초기화
+        state.text_buffer = ""
+
+    if processable_pieces:
+        await synth_and_stream(ch, processable_pieces, state.speaker, state.tgt_sr, tag="TTS_STREAM")
+
+async def _on_end(ch: _Channel, data: dict, state: _TTSStreamState):
+    # 남은 버퍼를 로컬로 복사하고 즉시 초기화 (타이밍 이슈 방지)
+    final_text = state.text_buffer.strip()
+    state.text_buffer = ""  # 처리 전에 먼저 초기화하여 다음 요청과 격리
+
+    if final_text:
+        if enableDebugLog:
+            print(f"[TTS_STREAM] Processing final buffer: '{final_text}'")
+
+        # slice_text로 더 작은 조각으로 나누기
+        final_pieces = slice_text(final_text)
+
+        await synth_and_stream(ch, final_pieces, state.speaker, state.tgt_sr, tag="TTS_STREAM", label="Final piece")
+
+    # 종료 신호 전송 (버퍼는 이미 초기화됨)
+    await ch.end()
+    if enableDebugLog: print("[TTS_STREAM] Utterance completed, ready for next")
+
+async def _on_speaker(ch: _Channel, data: dict, state: _TTSStreamState):
+    try:
+        state.speaker = int(data.get("speaker", DEFAULT_SPEAKER_ID))
+    except (TypeError, ValueError) as e:
+        print(f"[TTS_STREAM] Invalid speaker: {e}")
+        return
+    if enableDebugLog:
+        print(f"[TTS_STREAM] Speaker changed to: {state.speaker}")
+
+# 메시지 type → 핸들러 (if/elif 체인 대신 dict 조회)
+_TTS_STREAM_HANDLERS = {
+    "text": _on_text,
+    "end": _on_end,
+    "speaker": _on_speaker,
+}
 
 @app.websocket("/ws/tts_stream")
 async def ws_tts_stream(ws: WebSocket):
     """텍스트 스트리밍 → VOICEVOX + RVC → 오디오 스트리밍 (실시간)"""
     await ws.accept()
+    ch = _Channel(ws)
     try:
         if enableDebugLog: print("[TTS_STREAM] WebSocket connected")
 
         # RVC 사용 가능성 체크
         if rvc is None:
-            await ws.send_text(json.dumps({"event": "error", "detail": "RVC not initialized"}))
+            await ch.event(EVT_ERROR, _RVC_NOT_READY)
             return
 
         # 준비 완료 신호
-        await ws.send_text(json.dumps({"event": "ready"}))
+        await ch.ready()
 
-        tgt_sr = getattr(rvc, "tgt_sr", 24000)
-        text_buffer = ""
-        speaker = DEFAULT_SPEAKER_ID
+        state = _TTSStreamState(getattr(rvc, "tgt_sr", OUT_SR))
 
         while True:
             try:
@@ -138,164 +629,23 @@ async def ws_tts_stream(ws: WebSocket):
                     break
 
                 if "text" in message and message["text"]:
+                    # 파싱 실패만 좁게 잡고, 핸들러 예외는 아래 Processing error로 올림
                     try:
-                        data = json.loads(message["text"])
-                        msg_type = data.get("type", "")
-
-                        if msg_type == "text":
-                            # 텍스트 청크 수신
-                            text_chunk = data.get("text", "")
-                            text_buffer += text_chunk
-
-                            if enableDebugLog:
-                                print(f"[TTS_STREAM] Received text chunk: '{text_chunk}' (buffer: '{text_buffer}')")
-
-                            # slice_text로 즉시 처리 가능한 조각 추출
-                            pieces = slice_text(text_buffer)
-
-                            # 처리 가능한 조각들 즉시 처리
-                            if pieces:
-                                # 마지막 조각은 미완성일 수 있으므로 확인
-                                # 버퍼가 구두점으로 끝나면 모든 조각 처리, 아니면 마지막 조각 보류
-                                processable_pieces = pieces
-                                if not re.search(r'[。！？!?、,.\n]$', text_buffer):
-                                    # 버퍼가 구두점으로 끝나지 않으면 마지막 조각은 미완성
-                                    if len(pieces) > 1:
-                                        processable_pieces = pieces[:-1]
-                                        # 마지막 조각을 버퍼에 남김
-                                        text_buffer = pieces[-1]
-                                    else:
-                                        # 조각이 1개뿐이면 아직 처리 불가
-                                        processable_pieces = []
-                                else:
-                                    # 구두점으로 끝나면 모두 처리하고 버퍼 초기화
-                                    text_buffer = ""
-
-                                for piece_idx, piece in enumerate(processable_pieces):
-                                    piece_start = time.perf_counter()
-                                    if enableDebugLog:
-                                        print(f"[TTS_STREAM] Processing piece {piece_idx+1}/{len(processable_pieces)}: '{piece}'")
-
-                                    # VOICEVOX 합성
-                                    try:
-                                        voicevox_start = time.perf_counter()
-                                        q = session.post(f"{VOICEVOX_URL}/audio_query",
-                                                       params={"text": piece, "speaker": speaker}, timeout=10).json()
-                                        q["outputSamplingRate"] = int(tgt_sr)
-                                        q["outputStereo"] = False
-                                        wav_bytes = session.post(f"{VOICEVOX_URL}/synthesis",
-                                                               params={"speaker": speaker}, json=q, timeout=30).content
-                                        voicevox_time = time.perf_counter() - voicevox_start
-
-                                        pcm, sr = wav_bytes_to_float32(wav_bytes)
-                                        if pcm is not None and pcm.size > 0:
-                                            # 전처리
-                                            pcm = pcm - np.mean(pcm)
-                                            peak = np.max(np.abs(pcm))
-                                            if peak > 0.95:
-                                                pcm = pcm * (0.95 / peak)
-
-                                            # RVC 변환
-                                            rvc_start = time.perf_counter()
-                                            conv, out_sr = rvc.convert(pcm, sr=sr)
-                                            rvc_time = time.perf_counter() - rvc_start
-
-                                            # 후처리
-                                            if conv.size > 0:
-                                                fade_len = min(240, conv.size // 20)
-                                                if fade_len > 0:
-                                                    fade_in = np.linspace(0, 1, fade_len)
-                                                    conv[:fade_len] *= fade_in
-                                                    fade_out = np.linspace(1, 0, fade_len)
-                                                    conv[-fade_len:] *= fade_out
-                                                conv[np.abs(conv) < 0.001] = 0
-
-                                                # 스트리밍
-                                                streaming_start = time.perf_counter()
-                                                for frame in iter_pcm16_frames(conv, out_sr, frame_ms=20):
-                                                    if frame:
-                                                        await ws.send_bytes(frame)
-                                                streaming_time = time.perf_counter() - streaming_start
-
-                                                piece_total = time.perf_counter() - piece_start
-                                                print(f"[TTS_STREAM] Piece {piece_idx+1}/{len(processable_pieces)} completed - VOICEVOX: {voicevox_time*1000:.1f}ms, RVC: {rvc_time*1000:.1f}ms, Streaming: {streaming_time*1000:.1f}ms, Total: {piece_total*1000:.1f}ms")
-
-                                    except Exception as e:
-                                        print(f"[TTS_STREAM] TTS error: {e}")
-
-                        elif msg_type == "end":
-                            # 남은 버퍼를 로컬로 복사하고 즉시 초기화 (타이밍 이슈 방지)
-                            final_text = text_buffer.strip()
-                            text_buffer = ""  # 처리 전에 먼저 초기화하여 다음 요청과 격리
-
-                            if final_text:
-                                if enableDebugLog:
-                                    print(f"[TTS_STREAM] Processing final buffer: '{final_text}'")
-
-                                # slice_text로 더 작은 조각으로 나누기
-                                final_pieces = slice_text(final_text)
-
-                                for piece_idx, piece in enumerate(final_pieces):
-                                    piece_start = time.perf_counter()
-                                    if enableDebugLog:
-                                        print(f"[TTS_STREAM] Processing final piece {piece_idx+1}/{len(final_pieces)}: '{piece}'")
-
-                                    try:
-                                        voicevox_start = time.perf_counter()
-                                        q = session.post(f"{VOICEVOX_URL}/audio_query",
-                                                       params={"text": piece, "speaker": speaker}, timeout=10).json()
-                                        q["outputSamplingRate"] = int(tgt_sr)
-                                        q["outputStereo"] = False
-                                        wav_bytes = session.post(f"{VOICEVOX_URL}/synthesis",
-                                                               params={"speaker": speaker}, json=q, timeout=30).content
-                                        voicevox_time = time.perf_counter() - voicevox_start
-
-                                        pcm, sr = wav_bytes_to_float32(wav_bytes)
-                                        if pcm is not None and pcm.size > 0:
-                                            pcm = pcm - np.mean(pcm)
-                                            peak = np.max(np.abs(pcm))
-                                            if peak > 0.95:
-                                                pcm = pcm * (0.95 / peak)
-
-                                            rvc_start = time.perf_counter()
-                                            conv, out_sr = rvc.convert(pcm, sr=sr)
-                                            rvc_time = time.perf_counter() - rvc_start
-
-                                            if conv.size > 0:
-                                                fade_len = min(240, conv.size // 20)
-                                                if fade_len > 0:
-                                                    fade_in = np.linspace(0, 1, fade_len)
-                                                    conv[:fade_len] *= fade_in
-                                                    fade_out = np.linspace(1, 0, fade_len)
-                                                    conv[-fade_len:] *= fade_out
-                                                conv[np.abs(conv) < 0.001] = 0
-
-                                                streaming_start = time.perf_counter()
-                                                for frame in iter_pcm16_frames(conv, out_sr, frame_ms=20):
-                                                    if frame:
-                                                        await ws.send_bytes(frame)
-                                                streaming_time = time.perf_counter() - streaming_start
-
-                                                piece_total = time.perf_counter() - piece_start
-                                                print(f"[TTS_STREAM] Final piece {piece_idx+1}/{len(final_pieces)} completed - VOICEVOX: {voicevox_time*1000:.1f}ms, RVC: {rvc_time*1000:.1f}ms, Streaming: {streaming_time*1000:.1f}ms, Total: {piece_total*1000:.1f}ms")
-                                    except Exception as e:
-                                        print(f"[TTS_STREAM] Final TTS error: {e}")
-
-                            # 종료 신호 전송 (버퍼는 이미 초기화됨)
-                            await ws.send_text(json.dumps({"event": "end"}))
-                            if enableDebugLog: print("[TTS_STREAM] Utterance completed, ready for next")
-
-                        elif msg_type == "speaker":
-                            speaker = int(data.get("speaker", DEFAULT_SPEAKER_ID))
-                            if enableDebugLog:
-                                print(f"[TTS_STREAM] Speaker changed to: {speaker}")
-
-                    except Exception as e:
+                        data = orjson.loads(message["text"])
+                    except ValueError as e:
                         print(f"[TTS_STREAM] Message parse error: {e}")
-
+                        continue
+                    if not isinstance(data, dict):
+                        continue
+                    handler = _TTS_STREAM_HANDLERS.get(data.get("type"))
+                    if handler is not None:
+                        await handler(ch, data, state)
+
+            except WebSocketDisconnect:
+                raise
             except Exception as e:
                 print(f"[TTS_STREAM] Processing error: {e}")
-                await ws.send_text(json.dumps({"event": "error", "detail": str(e)}))
+                await ch.error(e)
                 break
 
     except WebSocketDisconnect:
@@ -303,7 +653,7 @@ async def ws_tts_stream(ws: WebSocket):
     except Exception as e:
         print(f"[TTS_STREAM] Error: {e}")
         with suppress(Exception):
-            await ws.send_text(json.dumps({"event": "error", "detail": str(e)}))
+            await ch.error(e)
     finally:
         if enableDebugLog: print("[TTS_STREAM] WebSocket session ended")
 
@@ -311,19 +661,20 @@ async def ws_tts_stream(ws: WebSocket):
 async def ws_rvc(ws: WebSocket):
     """OpenAI Realtime 오디오를 받아서 RVC 변환만 하는 엔드포인트"""
     await ws.accept()
+    ch = _Channel(ws)
     try:
         if enableDebugLog: print("[RVC] RVC-only WebSocket connected")
 
         # RVC 사용 가능성 체크
         if rvc is None:
-            await ws.send_text(json.dumps({"event": "error", "detail": "RVC not initialized"}))
+            await ch.event(EVT_ERROR, _RVC_NOT_READY)
             return
 
         # 준비 완료 신호
-        await ws.send_text(json.dumps({"event": "ready"}))
+        await ch.ready()
 
-        tgt_sr = getattr(rvc, "tgt_sr", 24000)
-        audio_buffer = bytearray()
+        tgt_sr = getattr(rvc, "tgt_sr", OUT_SR)
+        audio_chunks: List[bytes] = []  # 발화 끝에서 b"".join으로 한 번에 합침
 
         # 디버그용 폴더 설정
         debug_dir = None
@@ -347,7 +698,7 @@ async def ws_rvc(ws: WebSocket):
                 # 텍스트 메시지 우선 처리 (제어 명령)
                 if "text" in message and message["text"]:
                     try:
-                        cmd = json.loads(message["text"])
+                        cmd = orjson.loads(message["text"])
                         # OpenAI Realtime API 이벤트 처리
                         event_type = cmd.get("type", "")
 
@@ -355,11 +706,10 @@ async def ws_rvc(ws: WebSocket):
                         if event_type in ["end", "response.done", "response.output_item.done"]:
                             is_receiving = False
                             # 전체 버퍼를 한 번에 RVC 변환
-                            if len(audio_buffer) > 0:
+                            if audio_chunks:
                                 chunk_counter += 1
-                                chunk_data = bytes(audio_buffer)
-                                pcm_array = np.frombuffer(chunk_data, dtype=np.int16)
-                                pcm_f32 = pcm_array.astype(np.float32) / 32768.0
+                                pcm_array = np.frombuffer(b"".join(audio_chunks), dtype="<i2")
+                                pcm_f32 = np.multiply(pcm_array, _INV32768, dtype=np.float32)  # 1패스, 임시배열 없음
 
                                 if len(pcm_f32) > 0:
                                     # 입력 오디오 정보 로깅
@@ -370,82 +720,77 @@ async def ws_rvc(ws: WebSocket):
                                     # 디버그: 입력 오디오 저장
                                     if debug_dir:
                                         input_file = os.path.join(debug_dir, f"full_input.wav")
-                                        sf.write(input_file, pcm_f32, 24000)
+                                        _dump(input_file, pcm_f32, 24000)
 
                                     # 오디오 전처리 (DC 제거, 정규화, EQ)
                                     if np.max(np.abs(pcm_f32)) > 0:
-                                        # DC offset 제거
-                                        pcm_f32 = pcm_f32 - np.mean(pcm_f32)
-
-                                        # 볼륨 정규화 (RVC 입력은 충분한 볼륨 필요)
-                                        peak = np.max(np.abs(pcm_f32))
-                                        if peak > 0.01:  # 너무 작은 신호 제외
-                                            target_level = 0.7  # RVC에 적합한 입력 레벨
-                                            pcm_f32 = pcm_f32 * (target_level / peak)
-                                            pcm_f32 = np.clip(pcm_f32, -1.0, 1.0)
+                                        # DC offset 제거 + 볼륨 정규화 (RVC 입력은 충분한 볼륨 필요)
+                                        # 0.01 이하 신호는 제외, 그 외는 peak를 RVC에 적합한 0.7로
+                                        _normalize_inplace(pcm_f32, target=0.7, min_peak=0.01)
 
                                         # 디버그: 전처리 후 오디오 저장
                                         if debug_dir:
                                             pre_rvc_file = os.path.join(debug_dir, f"full_pre_rvc.wav")
-                                            sf.write(pre_rvc_file, pcm_f32, 24000)
+                                            _dump(pre_rvc_file, pcm_f32, 24000)
+
+                                        # 입력 오디오 특성 분석 (PITCH_DEBUG=true일 때만 / 루프 밖 스레드에서)
+                                        if ENABLE_PITCH_DEBUG:
+                                            f0_range = await asyncio.to_thread(_compute_f0_range, pcm_f32, 24000)
+                                            print(f"[RVC] Input pitch range: {f0_range}")
 
-                                        # RVC 변환
+                                        # RVC 변환: 무음 지점에서 블록으로 나눠 변환되는 대로 바로 송출 (첫 오디오까지 = 첫 블록 변환 시간)
                                         rvc_start = time.perf_counter()
-                                        conv, out_sr = rvc.convert(pcm_f32, sr=24000)
+                                        raw_blocks, final_blocks = [], []
+                                        out_samples, out_sr, k, n_blocks = 0, tgt_sr, 0, 0
+                                        carry = np.zeros(0, dtype=np.int16)
+                                        async for conv, out_sr, last in rvc_stream(pcm_f32, 24000):
+                                            n_blocks += 1
+                                            if enableDebugLog:
+                                                print(f"[RVC] Block {n_blocks}: {len(conv)} samples, max={np.max(np.abs(conv)) if conv.size else 0:.3f}, SR={out_sr}, t={(time.perf_counter() - rvc_start)*1000:.1f}ms")
+
+                                            # 디버그: RVC 원본 결과 (블록을 모아 끝에서 한 파일로)
+                                            if debug_dir:
+                                                raw_blocks.append(conv.copy())
+
+                                            # 출력 오디오 후처리 (무음 블록도 길이 유지를 위해 그대로 송출)
+                                            if len(conv) or (last and carry.size):
+                                                # 페이드는 발화 머리(첫 블록)/꼬리(마지막 블록)에만 + 미소값 제거 (단일 패스)
+                                                postprocess_audio(conv, fade_in=out_samples == 0, fade_out=last)
+
+                                                # PCM16 변환 1회 → 같은 버퍼를 디버그 WAV 저장과 송출에 공유
+                                                conv = pcm16(conv, clip=True)
+                                                if debug_dir:
+                                                    final_blocks.append(conv)
+                                                out_samples += len(conv)
+
+                                                # 블록 끝의 프레임 미만 조각은 다음 블록 앞에 붙여 보냄 (블록 경계에 0 패딩 없음)
+                                                conv, carry = split_frames(conv, carry, _frame_samples(out_sr), last)
+
+                                                # 변환된 블록을 100ms(20ms x 5) 단위로 스트리밍
+                                                for frame in iter_pcm16_frames(conv, out_sr, frame_ms=20, batch=SEND_BATCH_FRAMES):
+                                                    if frame:
+                                                        await ch.pcm(frame)
+                                                    k += 1
+                                                    if k % SEND_YIELD_EVERY == 0:
+                                                        await asyncio.sleep(0)
                                         rvc_time = time.perf_counter() - rvc_start
 
                                         if enableDebugLog:
-                                            print(f"[RVC] Output: {len(conv)} samples, max={np.max(np.abs(conv)):.3f}, SR={out_sr}, time={rvc_time*1000:.1f}ms")
-                                            # 입력 오디오 특성 분석
-                                            f0_range = "unknown"
-                                            try:
-                                                import librosa
-                                                f0, voiced_flag, voiced_probs = librosa.pyin(pcm_f32, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'), sr=24000)
-                                                f0_valid = f0[~np.isnan(f0)]
-                                                if len(f0_valid) > 0:
-                                                    f0_mean = np.mean(f0_valid)
-                                                    f0_range = f"{np.min(f0_valid):.1f}-{np.max(f0_valid):.1f}Hz (mean: {f0_mean:.1f}Hz)"
-                                            except:
-                                                pass
-                                            print(f"[RVC] Input pitch range: {f0_range}")
+                                            print(f"[RVC] Output: {out_samples} samples in {n_blocks} blocks, SR={out_sr}, time={rvc_time*1000:.1f}ms")
 
-                                        # 디버그: RVC 원본 결과 저장
                                         if debug_dir:
-                                            rvc_raw_file = os.path.join(debug_dir, f"full_rvc_raw.wav")
-                                            sf.write(rvc_raw_file, conv, out_sr)
-
-                                        # 출력 오디오 후처리
-                                        if len(conv) > 0 and np.max(np.abs(conv)) > 0:
-                                            # 페이드 인/아웃 (클릭 노이즈 방지)
-                                            fade_samples = min(240, len(conv) // 20)  # 5ms @ 48kHz 또는 5%
-                                            if fade_samples > 0:
-                                                # 페이드 인
-                                                fade_in = np.linspace(0, 1, fade_samples)
-                                                conv[:fade_samples] *= fade_in
-                                                # 페이드 아웃
-                                                fade_out = np.linspace(1, 0, fade_samples)
-                                                conv[-fade_samples:] *= fade_out
-
-                                            # 매우 작은 값들을 0으로 (노이즈 제거)
-                                            conv[np.abs(conv) < 0.001] = 0
-
-                                            # 디버그: 최종 결과 저장
-                                            if debug_dir:
-                                                final_file = os.path.join(debug_dir, f"full_final.wav")
-                                                sf.write(final_file, conv, out_sr)
-
-                                            # 변환된 오디오를 20ms 프레임으로 스트리밍
-                                            for frame in iter_pcm16_frames(conv, out_sr, frame_ms=20):
-                                                if frame:
-                                                    await ws.send_bytes(frame)
-                                        else:
-                                            if enableDebugLog:
-                                                print("[RVC] Empty or silent output from RVC")
+                                            if raw_blocks:
+                                                _dump(os.path.join(debug_dir, "full_rvc_raw.wav"), np.concatenate(raw_blocks), out_sr)
+                                            if final_blocks:
+                                                _dump(os.path.join(debug_dir, "full_final.wav"), np.concatenate(final_blocks), out_sr)
+
+                                        if out_samples == 0 and enableDebugLog:
+                                            print("[RVC] Empty or silent output from RVC")
                                     else:
                                         if enableDebugLog:
                                             print("[RVC] Input audio too quiet, skipping")
 
-                            await ws.send_text(json.dumps({"event": "end"}))
+                            await ch.end()
                             break
                     except Exception as parse_error:
                         if enableDebugLog:
@@ -453,19 +798,19 @@ async def ws_rvc(ws: WebSocket):
 
                 elif "bytes" in message and message["bytes"]:
                     audio_chunk = message["bytes"]
-                    audio_buffer.extend(audio_chunk)
+                    audio_chunks.append(audio_chunk)
                     # 데이터 수신 중에는 버퍼만 쌓음 (전체 발화를 한 번에 처리)
 
             except Exception as e:
                 print(f"[RVC] Processing error: {e}")
-                await ws.send_text(json.dumps({"event": "error", "detail": str(e)}))
+                await ch.error(e)
                 break
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         with suppress(Exception):
-            await ws.send_text(json.dumps({"event": "error", "detail": str(e)}))
+            await ch.error(e)
     finally:
         with suppress(Exception):
             await ws.close()
@@ -493,13 +838,14 @@ async def _recv_init_json(ws, timeout: float = 5.0):
 
     print("[WS init raw]", repr(raw))  # ← 실제 받은 문자열을 눈으로 확인
     try:
-        return json.loads(raw), None
+        return orjson.loads(raw), None
     except Exception as e:
         return None, f"bad-json: {e}"
 
 @app.websocket("/ws/tts")
 async def ws_tts(ws: WebSocket):
     await ws.accept()
+    ch = _Channel(ws)
     try:
         # 1) 쿼리 먼저
         text = (ws.query_params.get("text") or "").strip()
@@ -509,23 +855,23 @@ async def ws_tts(ws: WebSocket):
         if not text:
             init, err = await _recv_init_json(ws, timeout=5.0)
             if err:
-                await ws.send_text(json.dumps({"event": "error", "detail": err}))
+                await ch.error(err)
                 return
             text = str(init.get("text", "")).strip()
             spk  = int(init.get("speaker", spk))
 
         if not text:
-            await ws.send_text(json.dumps({"event":"end"}))
+            await ch.end()
             return
 
         # 3) RVC 사용 가능성 체크
         if rvc is None:
-            await ws.send_text(json.dumps({"event": "error", "detail": "RVC not initialized"}))
+            await ch.event(EVT_ERROR, _RVC_NOT_READY)
             return
 
         # 4) ACK (클라 디버그용)
         print(f"[WS] Starting TTS for text='{text[:50]}...' speaker={spk}")
-        await ws.send_text(json.dumps({"event": "ready", "speaker": spk}))
+        await ch.ready(orjson.dumps({"event": "ready", "speaker": spk}).decode())
 
         # ===== 동기 처리 (스레드 제거) =====
         raw_pieces = slice_text(text)
@@ -536,10 +882,10 @@ async def ws_tts(ws: WebSocket):
         print(f"[DEBUG] Filtered pieces: {pieces}")
 
         if not pieces:
-            await ws.send_text(json.dumps({"event": "end"}))
+            await ch.end()
             return
 
-        tgt_sr = getattr(rvc, "tgt_sr", 24000)
+        tgt_sr = getattr(rvc, "tgt_sr", OUT_SR)
 
         # 디버그용 폴더 설정 (옵션)
         debug_dir = None
@@ -549,145 +895,24 @@ async def ws_tts(ws: WebSocket):
             os.makedirs(debug_dir, exist_ok=True)
             print(f"[DEBUG] Saving audio pieces to: {debug_dir}")
 
-        for i, part in enumerate(pieces):
-            try:
-                piece_start = time.perf_counter()
-                print(f"[WS] Processing part {i+1}/{len(pieces)}: '{part}'")
-
-                # 너무 짧은 피스는 건너뛰기 (노이즈 방지)
-                if len(part) < 2:
-                    print(f"[WS] Skipping too short piece: '{part}'")
-                    continue
-
-                # VOICEVOX 합성
-                voicevox_start = time.perf_counter()
-                q = session.post(f"{VOICEVOX_URL}/audio_query",
-                                params={"text": part, "speaker": spk}, timeout=10).json()
-                q["outputSamplingRate"] = int(tgt_sr)
-                q["outputStereo"] = False
-                wav_bytes = session.post(f"{VOICEVOX_URL}/synthesis",
-                                        params={"speaker": spk}, json=q, timeout=30).content
-                voicevox_time = time.perf_counter() - voicevox_start
-
-                pcm, sr = wav_bytes_to_float32(wav_bytes)
-                if pcm is None or pcm.size == 0:
-                    continue
-
-                # 디버그: 원본 VOICEVOX 결과 저장
-                if debug_dir:
-                    voicevox_file = os.path.join(debug_dir, f"piece_{i+1:02d}_voicevox.wav")
-                    sf.write(voicevox_file, pcm, sr)
-
-                # RVC 변환 (오디오 정리 포함)
-                rvc_start = time.perf_counter()
-                print(f"[WS] Converting audio with RVC for part {i+1}/{len(pieces)}")
-
-                # RVC 입력 전 정리
-                pcm_cleaned = pcm.copy()
-                if pcm_cleaned.size > 0:
-                    # DC offset 제거
-                    pcm_cleaned = pcm_cleaned - np.mean(pcm_cleaned)
-                    # 볼륨 정규화 (클리핑 방지)
-                    peak = np.max(np.abs(pcm_cleaned))
-                    if peak > 0.95:
-                        pcm_cleaned = pcm_cleaned * (0.95 / peak)
-
-                # 디버그: RVC 입력 전처리 결과 저장
-                if debug_dir:
-                    pre_rvc_file = os.path.join(debug_dir, f"piece_{i+1:02d}_pre_rvc.wav")
-                    sf.write(pre_rvc_file, pcm_cleaned, sr)
-
-                # 피치 분석 (VOICEVOX 입력)
-                if enableDebugLog:
-                    f0_range = "unknown"
-                    try:
-                        import librosa
-                        f0, voiced_flag, voiced_probs = librosa.pyin(pcm_cleaned, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'), sr=sr)
-                        f0_valid = f0[~np.isnan(f0)]
-                        if len(f0_valid) > 0:
-                            f0_mean = np.mean(f0_valid)
-                            f0_range = f"{np.min(f0_valid):.1f}-{np.max(f0_valid):.1f}Hz (mean: {f0_mean:.1f}Hz)"
-                    except:
-                        pass
-                    print(f"[TTS] VOICEVOX input pitch range: {f0_range}")
-
-                conv, out_sr = rvc.convert(pcm_cleaned, sr=sr)
-
-                # 디버그: RVC 원본 결과 저장
-                if debug_dir:
-                    rvc_raw_file = os.path.join(debug_dir, f"piece_{i+1:02d}_rvc_raw.wav")
-                    sf.write(rvc_raw_file, conv, out_sr)
-
-                # RVC 출력 후 정리 (노이즈 제거)
-                if conv.size > 0:
-                    # 시작/끝 페이드 (클릭음 방지)
-                    fade_len = min(240, conv.size // 20)  # 5ms @ 48kHz 또는 5%
-                    if fade_len > 0:
-                        # 페이드 인
-                        fade_in = np.linspace(0, 1, fade_len)
-                        conv[:fade_len] *= fade_in
-                        # 페이드 아웃
-                        fade_out = np.linspace(1, 0, fade_len)
-                        conv[-fade_len:] *= fade_out
-
-                    # 매우 작은 값들을 0으로 (노이즈 제거)
-                    conv[np.abs(conv) < 0.001] = 0
-
-                # 디버그: 최종 결과 저장
-                if debug_dir:
-                    final_file = os.path.join(debug_dir, f"piece_{i+1:02d}_final.wav")
-                    sf.write(final_file, conv, out_sr)
-
-                rvc_time = time.perf_counter() - rvc_start
-                print(f"[WS] RVC conversion completed successfully")
-                if debug_dir:
-                    print(f"[DEBUG] Saved debug files for piece {i+1}")
-
-            except Exception as e:
-                import traceback
-                tb = traceback.format_exc()
-                error_msg = f"Processing error: {e}"
-                print(f"[ERROR] {error_msg}")
-                print(f"[TRACEBACK] {tb}")
-                await ws.send_text(json.dumps({"event": "error", "detail": error_msg}))
-                break
-
-            # 오디오 스트리밍
-            streaming_start = time.perf_counter()
-            sent_any = False
-            frame_count = 0
-            for frame in iter_pcm16_frames(conv, out_sr, frame_ms=20):
-                if not frame:
-                    continue
-                await ws.send_bytes(frame)
-                sent_any = True
-                frame_count += 1
-
-            streaming_time = time.perf_counter() - streaming_start
-            piece_total_time = time.perf_counter() - piece_start
-
-            # 타이밍 로그 출력
-            print(f"[TIMING] Piece {i+1}/{len(pieces)} - VOICEVOX: {voicevox_time*1000:.1f}ms, RVC: {rvc_time*1000:.1f}ms, Streaming: {streaming_time*1000:.1f}ms, Total: {piece_total_time*1000:.1f}ms")
-
-            if frame_count > 0:
-                print(f"[WS] Sent {frame_count} audio frames for piece {i+1}/{len(pieces)}")
-
-            if not sent_any:
-                silence_samples = int(out_sr * 0.02)  # 20ms
-                await ws.send_bytes(b"\x00\x00" * silence_samples)
-
-            # 피스 사이에 짧은 침묵 추가 (노이즈 분리)
-            if i < len(pieces) - 1:  # 마지막 피스가 아니면
-                gap_samples = int(out_sr * 0.05)  # 50ms 침묵
-                await ws.send_bytes(b"\x00\x00" * gap_samples)
+        # VOICEVOX(동시) → RVC(순서) → 송출(순서) 파이프라인
+        try:
+            await synth_and_stream(ch, pieces, spk, tgt_sr, tag="WS", debug_dir=debug_dir,
+                                   gap_ms=50, skip_errors=False)
+        except WebSocketDisconnect:
+            raise
+        except Exception as e:
+            # traceback은 로거 핸들러가 켜져 있을 때만 포맷, 클라에는 예외 타입만
+            log.exception("[WS] Processing error: %s", e)
+            await ch.error(f"Processing error: {type(e).__name__}")
 
-        await ws.send_text(json.dumps({"event": "end"}))
+        await ch.end()
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         with suppress(Exception):
-            await ws.send_text(json.dumps({"event":"error","detail":str(e)}))
+            await ch.error(e)
     finally:
         with suppress(Exception):
             await ws.close()
\ No newline at end of file
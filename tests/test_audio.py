@@ -0,0 +1,139 @@
+# tests/test_audio.py
+import ctypes
+import os
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from server import audio
+from server.audio import (_pcm16_wav_layout, _silence_cuts, iter_pcm16_frames, pcm16, split_frames,
+                          wav_bytes_to_float32)
+
+PCM_C = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server", "ext", "pcm.c")
+
+
+def _wav(sr, channels, samples, extra_chunk=b""):
+    data = np.asarray(samples, dtype="<i2").tobytes()
+    fmt = struct.pack("<HHIIHH", 1, channels, sr, sr * 2 * channels, 2 * channels, 16)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunk + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def test_wav_layout_standard_header():
+    b = _wav(24000, 1, [0, 16384, -32768])
+    assert _pcm16_wav_layout(b) == (24000, 1, 44, 6)
+    pcm, sr = wav_bytes_to_float32(b)
+    assert sr == 24000 and pcm.dtype == np.float32
+    assert pcm.tolist() == [0.0, 0.5, -1.0]
+
+
+def test_wav_layout_skips_odd_sized_chunk():
+    # LIST 청크(홀수 길이 + 패딩 1바이트)를 건너뛰고 data를 찾음
+    b = _wav(16000, 2, [100, 300, -100, -300], extra_chunk=b"LIST" + struct.pack("<I", 3) + b"abc\0")
+    sr, channels, off, n = _pcm16_wav_layout(b)
+    assert (sr, channels, n) == (16000, 2, 8) and b[off - 8:off - 4] == b"data"
+    pcm, _ = wav_bytes_to_float32(b)
+    assert np.allclose(pcm, [200 / 32768, -200 / 32768])
+
+
+def test_wav_layout_rejects_non_pcm16():
+    b = bytearray(_wav(24000, 1, [0, 0]))
+    struct.pack_into("<H", b, 34, 24)  # 24bit
+    assert _pcm16_wav_layout(bytes(b)) is None
+    assert _pcm16_wav_layout(b"RIFF" + bytes(40)) is None
+
+
+def test_silence_cuts_land_on_quiet_frames():
+    sr = 16000
+    rng = np.random.default_rng(0)
+    x = (rng.standard_normal(sr * 7) * 0.3).astype(np.float32)
+    quiet = [int(1.8 * sr), int(4.1 * sr)]
+    for q in quiet:
+        x[q:q + sr // 50] = 0.0
+    cuts = _silence_cuts(x, sr)
+    assert len(cuts) == 2
+    for c, q in zip(cuts, quiet):
+        assert q <= c < q + sr // 50
+        assert not np.any(x[c:c + sr // 100])
+
+
+def test_silence_cuts_short_input_is_one_block():
+    assert _silence_cuts(np.ones(int(16000 * 2.9), dtype=np.float32), 16000) == []
+
+
+def test_frames_across_blocks_match_one_buffer():
+    sr, n = 24000, 480
+    rng = np.random.default_rng(1)
+    blocks = [(rng.uniform(-0.5, 0.5, m)).astype(np.float32) for m in (1000, 2357, 481)]
+    expect = b"".join(iter_pcm16_frames(np.concatenate(blocks), sr, batch=5))
+
+    out, carry = [], np.zeros(0, dtype=np.int16)
+    for j, b in enumerate(blocks):
+        buf, carry = split_frames(pcm16(b), carry, n, last=j == len(blocks) - 1)
+        assert buf.size % n == 0 or j == len(blocks) - 1
+        out.extend(iter_pcm16_frames(buf, sr, batch=5))
+    got = b"".join(out)
+    # 블록 경계에 0 패딩이 끼지 않고, 끝에서만 프레임 단위로 채움
+    assert got == expect
+    assert len(got) == 2 * n * -(-sum(b.size for b in blocks) // n)
+
+
+def _gated_reference(x, gate):
+    # NaN → 0, |v| < gate → 0, [-1, 1] 클립, float32 곱 후 0 방향 절삭
+    v = np.where(np.isnan(x), np.float32(0), x)
+    v = np.where(np.abs(v) < np.float32(gate), np.float32(0), np.clip(v, np.float32(-1), np.float32(1)))
+    return (v * np.float32(32767)).astype(np.int16)
+
+
+def _build_pcm(tmp_path, name, *flags):
+    cc = shutil.which("gcc") or shutil.which("cc")
+    if cc is None:
+        pytest.skip("C 컴파일러 없음")
+    so = str(tmp_path / name)
+    subprocess.run([cc, "-O3", "-shared", "-fPIC", *flags, "-o", so, PCM_C], check=True)
+    fn = ctypes.CDLL(so).convert_and_frame
+    fn.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_float, ctypes.c_void_p)
+    fn.restype = None
+    return fn
+
+
+def _sample_input():
+    rng = np.random.default_rng(2)
+    x = rng.uniform(-1.5, 1.5, 10_007).astype(np.float32)  # 16의 배수가 아닌 길이 → 스칼라 꼬리 포함
+    x[::97] = np.nan
+    x[5], x[6] = np.inf, -np.inf
+    x[7:9] = 0.004
+    return x
+
+
+@pytest.mark.parametrize("gate", [0.0, 0.01])
+def test_pcm16_c_scalar_avx2_numba_agree(tmp_path, gate):
+    x = _sample_input()
+    expect = _gated_reference(x, gate)
+    results = {}
+    for name, flags in (("scalar", ("-DPCM_NO_AVX2",)), ("avx2", ())):
+        fn = _build_pcm(tmp_path, f"pcm_{name}.so", *flags)
+        dst = np.empty(x.size, dtype=np.int16)
+        fn(x.ctypes.data, x.size, gate, dst.ctypes.data)
+        results[name] = dst
+    if audio._HAS_NUMBA:
+        dst = np.empty(x.size, dtype=np.int16)
+        audio._f32_to_pcm16_gated(x, dst, np.float32(gate))
+        results["numba"] = dst
+    for name, got in results.items():
+        assert np.array_equal(got, expect), name
+
+
+def test_pcm16_numpy_fallback_matches_kernel(monkeypatch):
+    x = _sample_input()
+    x = np.where(np.isfinite(x), x, 0).astype(np.float32)  # NumPy 경로는 NaN 정리 없음
+    monkeypatch.setattr(audio, "_HAS_PCM_EXT", False)
+    monkeypatch.setattr(audio, "_HAS_NUMBA", False)
+    assert np.array_equal(pcm16(x, clip=True, gate=0.01), _gated_reference(x, 0.01))
+    out = np.zeros(x.size + 10, dtype=np.int16)
+    view = pcm16(x, clip=True, out=out)
+    assert view.base is out and np.array_equal(view, _gated_reference(x, 0.0))
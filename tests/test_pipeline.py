@@ -0,0 +1,70 @@
+# tests/test_pipeline.py
+import asyncio
+
+from server.pipeline import merge_short_pieces, pipeline_pieces, slice_text
+
+
+def test_slice_text_keeps_punctuation_and_drops_empty():
+    assert slice_text("こんにちは。元気？、。うん") == ["こんにちは。", "元気？", "うん"]
+
+
+def test_merge_short_pieces_keeps_first_and_caps_length():
+    pieces = ["はい。", "そう", "です", "ね。", "とても長い文章がここに続いていきますよ、"]
+    merged = merge_short_pieces(pieces, max_chars=6)
+    assert merged[0] == "はい。"
+    assert merged[1:] == ["そうですね。", "とても長い文章がここに続いていきますよ、"]
+    assert "".join(merged) == "".join(pieces)
+    assert merge_short_pieces(pieces, max_chars=0) == pieces
+    assert merge_short_pieces(pieces[:2], max_chars=99) == pieces[:2]
+
+
+def test_pipeline_keeps_order():
+    out = []
+
+    async def synth(idx, piece):
+        await asyncio.sleep(0.01 * (3 - idx % 3))  # 뒤 피스가 먼저 끝나도 순서 유지
+        return piece
+
+    async def convert(idx, res):
+        return res.upper()
+
+    async def emit(idx, res):
+        out.append((idx, res))
+
+    asyncio.run(pipeline_pieces(list("abcdef"), synth, convert, emit))
+    assert out == list(enumerate("ABCDEF"))
+
+
+def test_failing_synth_stops_every_task():
+    started, cancelled = set(), set()
+
+    async def synth(idx, piece):
+        started.add(idx)
+        if idx == 1:
+            raise RuntimeError("voicevox down")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.add(idx)
+            raise
+        return piece
+
+    async def convert(idx, res):
+        return res
+
+    async def emit(idx, res):
+        pass
+
+    async def run():
+        before = asyncio.all_tasks()
+        try:
+            await asyncio.wait_for(pipeline_pieces([str(i) for i in range(8)], synth, convert, emit), 2.0)
+        except RuntimeError as e:
+            assert str(e) == "voicevox down"
+        else:
+            raise AssertionError("synth 실패가 전파되지 않음")
+        # 형제 합성 태스크까지 모두 끝나 있어야 함 (VOICEVOX 호출/put 대기가 남지 않음)
+        assert asyncio.all_tasks() == before
+
+    asyncio.run(run())
+    assert started and started - {1} == cancelled